@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip variants are always built
+    brotli = None
+
+# Build output, relative to the static folder
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+# Formats that are already compressed gain nothing from gzip or brotli
+PRECOMPRESSED_SKIP = {".jpg", ".jpeg", ".png", ".gif", ".ico", ".woff", ".woff2"}
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+# One year, the longest lifetime caches are expected to honour
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+# ----------------------------------------------------------------------------#
+# Build.
+# ----------------------------------------------------------------------------#
+def _fingerprint(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_css(name, content, manifest):
+    # Point relative url()s, e.g. ../fonts/x.ttf, at the fingerprinted files
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        quote, target = match.groups()
+        path, sep, suffix = re.match(r"([^?#]*)([?#]?)(.*)", target).groups()
+        resolved = posixpath.normpath(posixpath.join(base, path))
+        if resolved not in manifest:
+            return match.group(0)
+        new = posixpath.relpath(manifest[resolved], base) + sep + suffix
+        return f"url({quote}{new}{quote})"
+
+    return CSS_URL.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def build_assets(static_folder, level=9):
+    """Fingerprint and precompress every file under ``static_folder``.
+
+    Files are written to ``static/dist`` as ``name.<hash>.ext`` plus ``.gz``
+    and ``.br`` variants, and ``static/dist/manifest.json`` maps the original
+    names to the fingerprinted ones. Returns the manifest.
+    """
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for file in files:
+            if file.startswith("."):
+                continue
+            path = os.path.relpath(os.path.join(root, file), static_folder)
+            names.append(path.replace(os.sep, "/"))
+
+    # Stylesheets reference other assets, so hash them last
+    names.sort(key=lambda name: (name.endswith(".css"), name))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), "rb") as f:
+            content = f.read()
+        if name.endswith(".css"):
+            content = _rewrite_css(name, content, manifest)
+
+        hashed = _fingerprint(name, content)
+        manifest[name] = hashed
+        target = os.path.join(dist, hashed)
+        _write(target, content)
+
+        if posixpath.splitext(name)[1].lower() in PRECOMPRESSED_SKIP:
+            continue
+        _write(target + ".gz", gzip.compress(content, compresslevel=level, mtime=0))
+        if brotli is not None:
+            _write(target + ".br", brotli.compress(content, quality=11))
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+# ----------------------------------------------------------------------------#
+# Serving.
+# ----------------------------------------------------------------------------#
+def _manifest():
+    app = current_app
+    manifest = app.extensions.get("assets")
+    if manifest is None or app.debug:
+        path = os.path.join(app.static_folder, DIST, MANIFEST)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        app.extensions["assets"] = manifest
+    return manifest
+
+
+def asset_url(filename, **values):
+    """``url_for("static", filename=...)`` that prefers the built asset."""
+    hashed = _manifest().get(filename)
+    if hashed is None:
+        return url_for("static", filename=filename, **values)
+    return url_for("assets", filename=hashed, **values)
+
+
+def serve_asset(filename):
+    directory = os.path.join(current_app.static_folder, DIST)
+    accepted = request.accept_encodings
+
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accepted[encoding] and os.path.isfile(
+            os.path.join(directory, filename + suffix)
+        ):
+            # Send the precompressed variant with the original file's type
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            response = send_from_directory(
+                directory, filename + suffix, mimetype=mimetype
+            )
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename)
+
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.cli.add_command(assets_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("assets")
+def assets_cli():
+    """Build static assets."""
+
+
+@assets_cli.command("build")
+@click.option("--level", default=9, help="gzip compression level.")
+def build_command(level):
+    """Fingerprint and precompress everything under static/."""
+    manifest = build_assets(current_app.static_folder, level=level)
+    click.echo(f"Built {len(manifest)} assets.")
@@ -0,0 +1,6 @@
+from flask_moment import Moment
+from flask_sqlalchemy import SQLAlchemy
+
+# Extensions are created unbound and attached to an app in create_app().
+db = SQLAlchemy()
+moment = Moment()
@@ -6,18 +6,55 @@ from wtforms import (
     SelectMultipleField,
     DateTimeField,
     BooleanField,
+    HiddenField,
+    IntegerField,
+    TextAreaField,
 )
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms.widgets import TextInput
+from wtforms.validators import DataRequired, InputRequired, AnyOf, URL, Regexp, ValidationError
+
+import search_index
+
+
+class Exists:
+    # Validates an ID against an in-memory ID index, see search_index.py
+    def __init__(self, index, message):
+        self.index = index
+        self.message = message
+
+    def __call__(self, form, field):
+        if field.data is not None and not self.index.exists(field.data):
+            raise ValidationError(self.message)
 
 
 class ShowForm(FlaskForm):
-    artist_id = StringField("artist_id")
-    venue_id = StringField("venue_id")
+    artist_id = IntegerField(
+        "artist_id",
+        # A text input, so that names can be typed to get ID suggestions
+        widget=TextInput(),
+        validators=[
+            InputRequired(),
+            Exists(search_index.artists, "There is no artist with this ID."),
+        ],
+    )
+    venue_id = IntegerField(
+        "venue_id",
+        widget=TextInput(),
+        validators=[
+            InputRequired(),
+            Exists(search_index.venues, "There is no venue with this ID."),
+        ],
+    )
     start_time = DateTimeField(
-        "start_time", validators=[DataRequired()], default=datetime.today()
+        "start_time", validators=[DataRequired()], default=datetime.today
     )
 
 
+class ShowBatchForm(FlaskForm):
+    # One show per line: artist_id, venue_id, start_time
+    shows = TextAreaField("shows", validators=[DataRequired()])
+
+
 class VenueForm(FlaskForm):
     name = StringField("name", validators=[DataRequired()])
     city = StringField("city", validators=[DataRequired()])
@@ -114,6 +151,9 @@ class VenueForm(FlaskForm):
 
     seeking_description = StringField("seeking_description")
 
+    # Row version the edit form was loaded with, see edit_venue_submission
+    version = HiddenField("version")
+
 
 class ArtistForm(FlaskForm):
     name = StringField("name", validators=[DataRequired()])
@@ -213,3 +253,34 @@ class ArtistForm(FlaskForm):
     seeking_venue = BooleanField("seeking_venue")
 
     seeking_description = StringField("seeking_description")
+
+    # Row version the edit form was loaded with, see edit_artist_submission
+    version = HiddenField("version")
+
+
+class AvailabilityForm(FlaskForm):
+    # Read from the query string, so there is no CSRF token
+    class Meta:
+        csrf = False
+
+    start = DateTimeField(
+        "start", validators=[DataRequired()], format=["%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M"]
+    )
+    end = DateTimeField(
+        "end", validators=[DataRequired()], format=["%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M"]
+    )
+    city = StringField("city")
+    state = SelectField(
+        "state",
+        choices=[("", "Any state")] + VenueForm.state.kwargs["choices"],
+        default="",
+    )
+    genre = SelectField(
+        "genre",
+        choices=[("", "Any genre")] + VenueForm.genres.kwargs["choices"],
+        default="",
+    )
+
+    def validate_end(self, field):
+        if self.start.data and field.data and field.data <= self.start.data:
+            raise ValidationError("The end must be after the start.")
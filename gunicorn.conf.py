@@ -0,0 +1,47 @@
+import gc
+import multiprocessing
+import os
+
+# Production server settings, used with `gunicorn -c gunicorn.conf.py wsgi:app`.
+# Every value can be overridden from the environment.
+bind = os.environ.get("BIND", "0.0.0.0:" + os.environ.get("PORT", "8000"))
+
+# One process per core and a few threads each; requests mostly wait on
+# Postgres. WEB_CONCURRENCY is also what Heroku sets for the dyno size.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Load the app once in the master so models, templates, forms and the
+# autocomplete indexes are shared copy-on-write by the workers
+preload_app = True
+
+# Recycle workers after a jittered number of requests to contain memory
+# growth, without restarting all of them at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Seconds a stopping worker gets to finish its requests
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    # Keep the preloaded objects out of the collector so that its passes
+    # don't touch, and so copy, their pages in the workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections the master opened while preloading can't be shared with
+    # the workers; drop them from the pools without closing them
+    from extensions import db
+    from wsgi import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,45 @@
+import os
+import threading
+
+from sqlalchemy import event
+
+
+def listen_once(target, identifier, fn):
+    """``event.listen()``, unless ``fn`` already listens for the event.
+
+    Engines and ``db.session`` are shared by every app, while ``init_app()``
+    runs once per app.
+    """
+    if not event.contains(target, identifier, fn):
+        event.listen(target, identifier, fn)
+
+
+class ProcessLocal:
+    """A value that every process builds for itself with ``factory``.
+
+    Threads, locks and pools don't survive a fork, so a forked worker that
+    inherited its parent's value builds a new one on first use. Arguments
+    to ``get()`` are passed on to ``factory`` when it runs.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        # (pid, value), replaced as a whole so that get() needs no lock
+        self._current = (None, None)
+
+    def get(self, *args):
+        pid, value = self._current
+        if pid == os.getpid():
+            return value
+        with self._lock:
+            pid, value = self._current
+            if pid != os.getpid():
+                value = self.factory(*args)
+                self._current = (os.getpid(), value)
+            return value
+
+    def peek(self):
+        """The value built by this process, or None if it has none yet."""
+        pid, value = self._current
+        return value if pid == os.getpid() else None
@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import inspect, update
+
+from extensions import db
+from hooks import ProcessLocal, listen_once
+from models import Job
+
+
+class JobRunner:
+    """Runs side-effect work after the request's transaction commits.
+
+    ``enqueue()`` adds a row to the ``jobs`` table in the same transaction as
+    the write that caused it, so a job exists exactly when its write does and
+    survives restarts. Once the session commits the job is handed to a small
+    thread pool; failures are retried with exponential backoff. With
+    ``JOBS_EAGER`` set, jobs run inline right after the commit instead, which
+    is what tests want.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self._pool = ProcessLocal(self._start_pool)
+
+    def init_app(self, app):
+        app.extensions["jobs"] = self
+        app.cli.add_command(jobs_cli)
+
+        listen_once(db.session, "after_commit", self._after_commit)
+        listen_once(db.session, "after_soft_rollback", self._after_rollback)
+
+    def task(self, fn):
+        """Register ``fn`` so that it can be enqueued by name."""
+        self.tasks[fn.__name__] = fn
+        return fn
+
+    def enqueue(self, fn, **kwargs):
+        """Schedule ``fn(**kwargs)`` to run once the current session commits."""
+        name = fn if isinstance(fn, str) else fn.__name__
+        if name not in self.tasks:
+            raise KeyError("Unknown job " + name)
+
+        job = Job(name=name, args=kwargs)
+        db.session.add(job)
+        db.session.info.setdefault("pending_jobs", []).append(job)
+        return job
+
+    # ------------------------------------------------------------------------#
+    # Session hooks.
+    # ------------------------------------------------------------------------#
+    def _after_commit(self, session):
+        jobs = session.info.pop("pending_jobs", None)
+        if not jobs:
+            return
+
+        app = current_app._get_current_object()
+        # Attributes are expired by the commit and no SQL may run in this hook,
+        # so take the ids from the identity map
+        job_ids = [inspect(job).identity[0] for job in jobs]
+
+        if app.config["JOBS_EAGER"]:
+            for job_id in job_ids:
+                self._run(app, job_id)
+        else:
+            for job_id in job_ids:
+                self._submit(app, job_id)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop("pending_jobs", None)
+
+    # ------------------------------------------------------------------------#
+    # Execution.
+    # ------------------------------------------------------------------------#
+    def _start_pool(self, app):
+        executor = ThreadPoolExecutor(
+            max_workers=app.config["JOBS_WORKERS"],
+            thread_name_prefix="jobs",
+        )
+        return executor, threading.BoundedSemaphore(app.config["JOBS_QUEUE_SIZE"])
+
+    def _submit(self, app, job_id):
+        executor, slots = self._pool.get(app)
+
+        # When the in-process queue is full the job stays pending in the table
+        # and is picked up by the `flask jobs work` process
+        if not slots.acquire(blocking=False):
+            return
+
+        def work():
+            try:
+                self._run(app, job_id)
+            finally:
+                slots.release()
+
+        executor.submit(work)
+
+    def _run(self, app, job_id):
+        with app.app_context():
+            try:
+                # Claim the job so that no other worker runs it concurrently. The
+                # claim is a lease: a job whose worker died while running it
+                # becomes due again once JOBS_LEASE seconds have passed.
+                now = datetime.now()
+                claimed = db.session.execute(
+                    update(Job)
+                    .where(
+                        Job.id == job_id,
+                        Job.status.in_(("pending", "running")),
+                        Job.run_at <= now,
+                    )
+                    .values(
+                        status="running",
+                        attempts=Job.attempts + 1,
+                        run_at=now + timedelta(seconds=app.config["JOBS_LEASE"]),
+                    )
+                ).rowcount
+                db.session.commit()
+                if not claimed:
+                    return
+
+                job = db.session.get(Job, job_id)
+                try:
+                    self.tasks[job.name](**job.args)
+                except Exception as e:
+                    db.session.rollback()
+                    self._failed(app, job_id, e)
+                else:
+                    db.session.delete(job)
+                    db.session.commit()
+            finally:
+                db.session.close()
+
+    def _failed(self, app, job_id, error):
+        job = db.session.get(Job, job_id)
+        job.last_error = repr(error)
+
+        if job.attempts >= app.config["JOBS_MAX_ATTEMPTS"]:
+            job.status = "failed"
+            db.session.commit()
+            app.logger.error("Job %s (%s) failed: %r", job.id, job.name, error)
+            return
+
+        # Eager jobs are retried at once, rather than stalling the request
+        # that committed them for the whole backoff
+        eager = app.config["JOBS_EAGER"]
+        delay = 0 if eager else app.config["JOBS_BACKOFF"] * 2 ** (job.attempts - 1)
+        job.status = "pending"
+        job.run_at = datetime.now() + timedelta(seconds=delay)
+        db.session.commit()
+
+        if eager:
+            self._run(app, job_id)
+        else:
+            timer = threading.Timer(delay, self._submit, (app, job_id))
+            timer.daemon = True
+            timer.start()
+
+    def run_pending(self, limit=100):
+        """Run due jobs, e.g. those left over by a restart. Returns how many."""
+        app = current_app._get_current_object()
+        job_ids = db.session.scalars(
+            db.select(Job.id)
+            .where(
+                Job.status.in_(("pending", "running")),
+                Job.run_at <= datetime.now(),
+            )
+            .order_by(Job.run_at)
+            .limit(limit)
+        ).all()
+        db.session.close()
+
+        for job_id in job_ids:
+            self._run(app, job_id)
+        return len(job_ids)
+
+
+jobs = JobRunner()
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("jobs")
+def jobs_cli():
+    """Inspect and run background jobs."""
+
+
+@jobs_cli.command("run")
+def run_command():
+    """Run all due jobs once."""
+    total = 0
+    while True:
+        ran = jobs.run_pending()
+        total += ran
+        if not ran:
+            break
+    click.echo(f"Ran {total} jobs.")
+
+
+@jobs_cli.command("work")
+@click.option("--interval", default=5.0, help="Seconds between polls.")
+def work_command(interval):
+    """Keep running due jobs until interrupted."""
+    while True:
+        if not jobs.run_pending():
+            time.sleep(interval)
+
+
+@jobs_cli.command("retry-failed")
+def retry_failed_command():
+    """Put failed jobs back in the queue."""
+    count = db.session.execute(
+        update(Job)
+        .where(Job.status == "failed")
+        .values(status="pending", attempts=0, run_at=datetime.now())
+    ).rowcount
+    db.session.commit()
+    click.echo(f"Requeued {count} jobs.")
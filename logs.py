@@ -0,0 +1,196 @@
+import atexit
+import copy
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask.logging import default_handler
+from sqlalchemy.engine import Engine
+
+from hooks import ProcessLocal, listen_once
+
+# Attributes every LogRecord has; anything else was passed with extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed in ``extra=``."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    # Tags records logged while handling a request, e.g. exceptions, with it
+    def filter(self, record):
+        if has_request_context():
+            record.__dict__.setdefault("method", request.method)
+            record.__dict__.setdefault("path", request.path)
+            record.__dict__.setdefault("endpoint", request.endpoint)
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """Hands records to the listener thread, which does the formatting and
+    the I/O. Tracebacks are rendered here, since the frames they point at
+    don't outlive the request.
+
+    ``queue`` is a ``ProcessLocal`` of the listener, so each process starts
+    its own on its first record.
+    """
+
+    def enqueue(self, record):
+        self.queue.get().queue.put_nowait(record)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class QueueWriter:
+    """Writes records with ``output`` on a ``QueueListener`` thread.
+
+    Loggers get ``handler``, which only puts records on a queue. The
+    listener is started by the first record of each process.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self._listener = ProcessLocal(self._start)
+        self.handler = LogQueueHandler(self._listener)
+        atexit.register(self._stop)
+
+    def _start(self):
+        listener = QueueListener(queue.SimpleQueue(), self.output)
+        listener.start()
+        return listener
+
+    def _stop(self):
+        listener = self._listener.peek()
+        if listener is not None:
+            listener.stop()
+
+
+class AsyncLogging:
+    """Moves log output off the request thread.
+
+    Records go through a ``QueueWriter`` that writes them as JSON lines to
+    ``LOG_FILE``, or to stderr when it is empty or the app runs in debug
+    mode.
+    """
+
+    def __init__(self):
+        self._writer = None
+
+    def init_app(self, app):
+        app.extensions["logs"] = self
+        if self._writer is None:
+            log_file = app.config["LOG_FILE"]
+            if log_file and not app.debug:
+                output = logging.FileHandler(log_file)
+            else:
+                output = logging.StreamHandler()
+            output.setFormatter(JSONFormatter())
+            self._writer = QueueWriter(output)
+            self._writer.handler.addFilter(RequestContextFilter())
+
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self._writer.handler)
+        app.logger.setLevel(app.config["LOG_LEVEL"])
+
+        app.before_request(_start_request)
+        app.after_request(_end_response)
+        app.teardown_request(_log_request)
+
+        listen_once(Engine, "before_cursor_execute", _before_cursor_execute)
+        listen_once(Engine, "after_cursor_execute", _after_cursor_execute)
+        listen_once(Engine, "handle_error", _handle_error)
+
+
+logs = AsyncLogging()
+
+
+# ----------------------------------------------------------------------------#
+# Request timing.
+# ----------------------------------------------------------------------------#
+def _start_request():
+    g.request_started = time.perf_counter()
+    # [number of queries, seconds spent in them]
+    g.db_stats = [0, 0.0]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = g.get("db_stats") if has_request_context() else None
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        started.pop()
+
+
+def _end_response(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _log_request(error):
+    """Log requests slower than ``LOG_SLOW_REQUEST_MS`` as warnings, and a
+    ``LOG_SAMPLE_RATE`` share of the others.
+
+    This runs on teardown, which for a streamed page comes once its last
+    chunk is sent, so the rendering and queries of the body are counted.
+    """
+    started = g.pop("request_started", None)
+    if started is None:
+        return
+    duration = (time.perf_counter() - started) * 1000
+    config = current_app.config
+    slow = duration >= config["LOG_SLOW_REQUEST_MS"]
+    if not slow and random.random() >= config["LOG_SAMPLE_RATE"]:
+        return
+
+    queries, db_time = g.db_stats
+    current_app.logger.log(
+        logging.WARNING if slow else logging.INFO,
+        "Slow request" if slow else "Request",
+        extra={
+            "route": request.url_rule.rule if request.url_rule else None,
+            "status": g.get("response_status", 500),
+            "duration_ms": round(duration, 1),
+            "queries": queries,
+            "db_ms": round(db_time * 1000, 1),
+        },
+    )
@@ -0,0 +1,81 @@
+"""add dashboard rollups
+
+Revision ID: a6d31f08c2e9
+Revises: f19b6d2e8c53
+Create Date: 2026-10-19 18:41:07.532814
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6d31f08c2e9"
+down_revision = "f19b6d2e8c53"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rollups",
+        sa.Column("metric", sa.String(length=30), nullable=False),
+        sa.Column("key", sa.String(length=200), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("metric", "key"),
+    )
+    op.create_index("ix_rollups_metric_count", "rollups", ["metric", "count"])
+    op.create_table(
+        "rollup_deltas",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("metric", sa.String(length=30), nullable=False),
+        sa.Column("key", sa.String(length=200), nullable=False),
+        sa.Column("delta", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_rollup_deltas_metric_key", "rollup_deltas", ["metric", "key"])
+
+    # Count what is already there, the way record_shows(), record_venues()
+    # and record_artists() in rollups.py do
+    op.execute(
+        """
+        WITH all_shows AS (
+            SELECT venue_id, artist_id, start_time FROM shows
+            UNION ALL
+            SELECT venue_id, artist_id, start_time FROM shows_archive
+        ), genres AS (
+            SELECT venues.state || ':' || genre AS key
+            FROM all_shows
+            JOIN venues ON venues.id = all_shows.venue_id
+            JOIN artists ON artists.id = all_shows.artist_id
+            CROSS JOIN unnest(artists.genres::varchar[]) AS genre
+            WHERE venues.state IS NOT NULL AND genre <> ''
+        )
+        INSERT INTO rollups (metric, key, count)
+        SELECT 'shows_by_month', to_char(start_time, 'YYYY-MM'), count(*)
+        FROM all_shows GROUP BY 2
+        UNION ALL
+        SELECT 'venue_shows', venue_id::varchar, count(*) FROM all_shows GROUP BY 2
+        UNION ALL
+        SELECT 'artist_shows', artist_id::varchar, count(*) FROM all_shows GROUP BY 2
+        UNION ALL
+        SELECT 'genre_state', key, count(*) FROM genres GROUP BY 2
+        UNION ALL
+        SELECT 'venues', 'total', count(*) FROM venues HAVING count(*) > 0
+        UNION ALL
+        SELECT 'venues', 'seeking', count(*) FROM venues
+        WHERE seeking_talent HAVING count(*) > 0
+        UNION ALL
+        SELECT 'artists', 'total', count(*) FROM artists HAVING count(*) > 0
+        UNION ALL
+        SELECT 'artists', 'seeking', count(*) FROM artists
+        WHERE seeking_venue HAVING count(*) > 0
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_rollup_deltas_metric_key", table_name="rollup_deltas")
+    op.drop_table("rollup_deltas")
+    op.drop_index("ix_rollups_metric_count", table_name="rollups")
+    op.drop_table("rollups")
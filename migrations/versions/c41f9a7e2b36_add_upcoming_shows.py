@@ -0,0 +1,63 @@
+"""add upcoming_shows projection
+
+Revision ID: c41f9a7e2b36
+Revises: b7e2d4c1a9f0
+Create Date: 2026-10-19 13:41:52.118934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c41f9a7e2b36"
+down_revision = "b7e2d4c1a9f0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "upcoming_shows",
+        sa.Column("show_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("venue_id", sa.Integer(), nullable=False),
+        sa.Column("artist_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("venue_name", sa.String(), nullable=True),
+        sa.Column("venue_image_link", sa.String(length=500), nullable=True),
+        sa.Column("artist_name", sa.String(), nullable=True),
+        sa.Column("artist_image_link", sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint("show_id"),
+    )
+    op.create_index(
+        "ix_upcoming_shows_venue_id_start_time",
+        "upcoming_shows",
+        ["venue_id", "start_time"],
+    )
+    op.create_index(
+        "ix_upcoming_shows_artist_id_start_time",
+        "upcoming_shows",
+        ["artist_id", "start_time"],
+    )
+    op.create_index("ix_upcoming_shows_start_time", "upcoming_shows", ["start_time"])
+
+    # Seed with the shows that are upcoming right now
+    op.execute(
+        """
+        INSERT INTO upcoming_shows (show_id, venue_id, artist_id, start_time,
+            venue_name, venue_image_link, artist_name, artist_image_link)
+        SELECT shows.id, shows.venue_id, shows.artist_id, shows.start_time,
+            venues.name, venues.image_link, artists.name, artists.image_link
+        FROM shows
+        JOIN venues ON venues.id = shows.venue_id
+        JOIN artists ON artists.id = shows.artist_id
+        WHERE shows.start_time > now()
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_upcoming_shows_start_time", table_name="upcoming_shows")
+    op.drop_index("ix_upcoming_shows_artist_id_start_time", table_name="upcoming_shows")
+    op.drop_index("ix_upcoming_shows_venue_id_start_time", table_name="upcoming_shows")
+    op.drop_table("upcoming_shows")
@@ -0,0 +1,34 @@
+"""add version columns to venues and artists
+
+Revision ID: d83a5f1c07e4
+Revises: c41f9a7e2b36
+Create Date: 2026-10-19 14:02:37.550214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d83a5f1c07e4"
+down_revision = "c41f9a7e2b36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default is a metadata-only change on Postgres 11+, so existing
+    # rows are not rewritten
+    op.add_column(
+        "venues",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+    op.add_column(
+        "artists",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("artists", "version")
+    op.drop_column("venues", "version")
@@ -0,0 +1,148 @@
+"""partition shows by start_time and add shows_archive
+
+Revision ID: e5c2b8d94a17
+Revises: d83a5f1c07e4
+Create Date: 2026-10-19 14:27:03.914472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5c2b8d94a17"
+down_revision = "d83a5f1c07e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # start_time becomes part of the primary key, and venue_id and artist_id
+    # become NOT NULL. Stop rather than drop such shows: fill in the missing
+    # values or delete those shows first.
+    columns = ("start_time", "venue_id", "artist_id")
+    missing = op.get_bind().execute(
+        sa.text(
+            "SELECT "
+            + ", ".join(f"count(*) FILTER (WHERE {c} IS NULL)" for c in columns)
+            + " FROM shows"
+        )
+    ).one()
+    problems = [
+        f"{count} shows have no {column}"
+        for column, count in zip(columns, missing)
+        if count
+    ]
+    if problems:
+        raise RuntimeError(
+            "; ".join(problems) + "; set the missing values or delete those "
+            "shows before partitioning shows"
+        )
+
+    op.execute("ALTER TABLE shows RENAME TO shows_unpartitioned")
+    op.execute(
+        "ALTER TABLE shows_unpartitioned "
+        "RENAME CONSTRAINT shows_pkey TO shows_unpartitioned_pkey"
+    )
+
+    # The partition key has to be part of the primary key
+    op.execute(
+        """
+        CREATE TABLE shows (
+            id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+            venue_id integer NOT NULL REFERENCES venues (id),
+            artist_id integer NOT NULL REFERENCES artists (id),
+            start_time timestamp without time zone NOT NULL,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+        """
+    )
+    op.execute("CREATE TABLE shows_default PARTITION OF shows DEFAULT")
+
+    # One partition per month that has shows, and for the next twelve months
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT date_trunc('month', start_time)::date
+                FROM shows_unpartitioned
+                UNION
+                SELECT (date_trunc('month', now()) + make_interval(months => n))::date
+                FROM generate_series(0, 12) AS n
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF shows FOR VALUES FROM (%L) TO (%L)',
+                    'shows_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month,
+                    (month + interval '1 month')::date
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO shows (id, venue_id, artist_id, start_time)
+        SELECT id, venue_id, artist_id, start_time
+        FROM shows_unpartitioned
+        """
+    )
+    op.execute("ALTER SEQUENCE shows_id_seq OWNED BY shows.id")
+    op.execute("DROP TABLE shows_unpartitioned")
+
+    op.create_index("ix_shows_venue_id_start_time", "shows", ["venue_id", "start_time"])
+    op.create_index("ix_shows_artist_id_start_time", "shows", ["artist_id", "start_time"])
+
+    op.create_table(
+        "shows_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("venue_id", sa.Integer(), nullable=False),
+        sa.Column("artist_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_shows_archive_venue_id_start_time",
+        "shows_archive",
+        ["venue_id", "start_time"],
+    )
+    op.create_index(
+        "ix_shows_archive_artist_id_start_time",
+        "shows_archive",
+        ["artist_id", "start_time"],
+    )
+
+
+def downgrade():
+    op.execute("ALTER TABLE shows RENAME TO shows_partitioned")
+    op.execute(
+        "ALTER TABLE shows_partitioned "
+        "RENAME CONSTRAINT shows_pkey TO shows_partitioned_pkey"
+    )
+    op.execute(
+        """
+        CREATE TABLE shows (
+            id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+            venue_id integer NOT NULL REFERENCES venues (id),
+            artist_id integer NOT NULL REFERENCES artists (id),
+            start_time timestamp without time zone,
+            CONSTRAINT shows_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO shows (id, venue_id, artist_id, start_time)
+        SELECT id, venue_id, artist_id, start_time FROM shows_partitioned
+        UNION ALL
+        SELECT id, venue_id, artist_id, start_time FROM shows_archive
+        """
+    )
+    op.execute("ALTER SEQUENCE shows_id_seq OWNED BY shows.id")
+    op.execute("DROP TABLE shows_partitioned")
+    op.drop_table("shows_archive")
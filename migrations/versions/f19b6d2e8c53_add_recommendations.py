@@ -0,0 +1,32 @@
+"""add recommendations lookup table
+
+Revision ID: f19b6d2e8c53
+Revises: e5c2b8d94a17
+Create Date: 2026-10-19 15:12:40.208117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f19b6d2e8c53"
+down_revision = "e5c2b8d94a17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "recommendations",
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("subject_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("rank", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("related_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("kind", "subject_id", "rank"),
+    )
+
+
+def downgrade():
+    op.drop_table("recommendations")
@@ -1,4 +1,5 @@
-from config import db
+from datetime import datetime
+from extensions import db
 
 
 # ----------------------------------------------------------------------------#
@@ -19,8 +20,12 @@ class Venue(db.Model):
     website = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, default=1)
     shows = db.relationship("Show", cascade="all, delete", backref="venue")
 
+    # UPDATEs check and bump the version (optimistic concurrency)
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Artist(db.Model):
     __tablename__ = "artists"
@@ -36,16 +41,117 @@ class Artist(db.Model):
     website = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, default=1)
     shows = db.relationship("Show", backref="artist")
 
+    # UPDATEs check and bump the version (optimistic concurrency)
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Show(db.Model):
     __tablename__ = "shows"
 
+    # Partitioned by start_time, which has to be part of the primary key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey("venues.id"), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey("artists.id"), nullable=False)
+    start_time = db.Column(db.DateTime, primary_key=True)
+
+    __table_args__ = (
+        db.Index("ix_shows_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_shows_artist_id_start_time", "artist_id", "start_time"),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+
+
+# Shows moved out of the partitioned shows table by `flask partitions archive`,
+# see partitions.py.
+class ArchivedShow(db.Model):
+    __tablename__ = "shows_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    artist_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_shows_archive_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_shows_archive_artist_id_start_time", "artist_id", "start_time"),
+    )
+
+
+# Denormalized copy of every show that has not started yet, maintained by the
+# jobs in upcoming.py so that pages can list upcoming shows without scanning
+# shows or joining artists and venues.
+class UpcomingShow(db.Model):
+    __tablename__ = "upcoming_shows"
+
+    show_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    artist_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    venue_name = db.Column(db.String)
+    venue_image_link = db.Column(db.String(500))
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+
+    __table_args__ = (
+        db.Index("ix_upcoming_shows_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_upcoming_shows_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_upcoming_shows_start_time", "start_time"),
+    )
+
+
+# Top related artists and venues per artist or venue, precomputed by
+# recommendations.py. kind is similar_artists, similar_venues or
+# recommended_venues (venues for an artist).
+class Recommendation(db.Model):
+    __tablename__ = "recommendations"
+
+    kind = db.Column(db.String(20), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    related_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+# Dashboard counters, see rollups.py. Writes append to rollup_deltas, which
+# compaction folds into rollups.
+class Rollup(db.Model):
+    __tablename__ = "rollups"
+
+    metric = db.Column(db.String(30), primary_key=True)
+    key = db.Column(db.String(200), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (db.Index("ix_rollups_metric_count", "metric", "count"),)
+
+
+class RollupDelta(db.Model):
+    __tablename__ = "rollup_deltas"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    metric = db.Column(db.String(30), nullable=False)
+    key = db.Column(db.String(200), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index("ix_rollup_deltas_metric_key", "metric", "key"),)
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey("venues.id"))
-    artist_id = db.Column(db.Integer, db.ForeignKey("artists.id"))
-    start_time = db.Column(db.DateTime)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(db.JSON, nullable=False, default=dict)
+    # pending, running or failed; finished jobs are deleted
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (db.Index("ix_jobs_status_run_at", "status", "run_at"),)
 
 
 artist_fields = [
@@ -62,7 +168,6 @@ artist_fields = [
 ]
 
 venue_fields = [
-    "id",
     "name",
     "city",
     "state",
@@ -0,0 +1,401 @@
+from contextlib import contextmanager
+import random
+import threading
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+# SQLSTATEs of lock_timeout and statement_timeout errors
+LOCK_NOT_AVAILABLE = "55P03"
+QUERY_CANCELED = "57014"
+
+PROGRESS_TABLE = "online_migration_progress"
+
+# Helpers for migrations that must not block the app on a large database
+# (Postgres only). Rewriting a table, or waiting for its lock, inside the
+# migration's transaction stalls every query on that table until it commits.
+# Instead:
+#
+#     def upgrade():
+#         add_column("artists", sa.Column("slug", sa.String(), nullable=True))
+#         create_index_concurrently("ix_artists_slug", "artists", ["slug"])
+#         backfill("artists_slug", "artists", "slug = lower(name)", where="slug IS NULL")
+#
+# add_column() and lock_retries() give up on a lock quickly and try again;
+# create_index_concurrently() and backfill() commit what the migration did
+# so far and then work without holding long locks.
+
+
+def _op():
+    # Alembic is only installed where `flask db` runs
+    from alembic import op
+
+    return op
+
+
+def _timed_out(error, codes=(LOCK_NOT_AVAILABLE,)):
+    return getattr(error.orig, "pgcode", None) in codes
+
+
+@contextmanager
+def autocommit(bind=None):
+    """Yield a connection on which every statement commits on its own:
+    ``bind``, or the migration's connection once the migration's work so far
+    has been committed."""
+    if bind is not None:
+        yield bind
+        return
+    op = _op()
+    with op.get_context().autocommit_block():
+        yield op.get_bind()
+
+
+# ----------------------------------------------------------------------------#
+# Lock guards.
+# ----------------------------------------------------------------------------#
+def lock_retries(fn, lock_timeout="2s", attempts=10, backoff=0.5, bind=None):
+    """Call ``fn()``, which runs DDL, giving up on locks after ``lock_timeout``
+    and retrying with exponential backoff.
+
+    While an ALTER TABLE waits for its lock, every query on the table queues
+    behind it, so waiting briefly and retrying is kinder than waiting long.
+    Each attempt runs in a savepoint of the migration's transaction, and the
+    transaction's own lock_timeout is restored once ``fn()`` succeeds.
+
+    A failed attempt only releases the locks taken inside its savepoint.
+    Locks that the migration took before calling this are held through the
+    backoff, so call it before anything else that locks a busy table, or
+    after ``autocommit()``.
+    """
+    bind = bind if bind is not None else _op().get_bind()
+    previous = bind.execute(text("SELECT current_setting('lock_timeout')")).scalar()
+    for attempt in range(1, attempts + 1):
+        savepoint = bind.begin_nested()
+        bind.execute(
+            text("SELECT set_config('lock_timeout', :timeout, true)"),
+            {"timeout": lock_timeout},
+        )
+        try:
+            result = fn()
+        except OperationalError as error:
+            savepoint.rollback()
+            if not _timed_out(error) or attempt == attempts:
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1))
+        else:
+            bind.execute(
+                text("SELECT set_config('lock_timeout', :timeout, true)"),
+                {"timeout": previous},
+            )
+            savepoint.commit()
+            return result
+
+
+def add_column(table, column, **kwargs):
+    """``op.add_column`` under ``lock_retries()``.
+
+    Only add nullable columns, or columns with a constant default, which
+    Postgres 11+ adds without rewriting the table; fill them with
+    ``backfill()``.
+    """
+    op = _op()
+    return lock_retries(lambda: op.add_column(table, column), **kwargs)
+
+
+# ----------------------------------------------------------------------------#
+# Indexes.
+# ----------------------------------------------------------------------------#
+def create_index_concurrently(name, table, columns, unique=False, where=None, bind=None):
+    """Build an index without blocking writes to ``table``.
+
+    A build that was interrupted leaves an invalid index behind, which is
+    dropped and rebuilt; a valid index of that name is left alone. Postgres
+    can't build indexes concurrently on a partitioned table such as shows.
+    """
+    with autocommit(bind) as conn:
+        valid = conn.execute(
+            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+            {"name": name},
+        ).scalar()
+        if valid:
+            return False
+        if valid is not None:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(
+            text(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} "
+                f"ON {table} ({', '.join(columns)})"
+                + (f" WHERE {where}" if where else "")
+            )
+        )
+        return True
+
+
+def drop_index_concurrently(name, bind=None):
+    with autocommit(bind) as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+# ----------------------------------------------------------------------------#
+# Backfills.
+# ----------------------------------------------------------------------------#
+def _progress_table(conn):
+    conn.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+                name text PRIMARY KEY,
+                last_key bigint NOT NULL,
+                rows bigint NOT NULL DEFAULT 0,
+                finished_at timestamp,
+                updated_at timestamp NOT NULL
+            )
+            """
+        )
+    )
+
+
+def backfill(
+    name,
+    table,
+    assignments,
+    where=None,
+    key="id",
+    batch_size=10000,
+    min_batch_size=100,
+    target=0.2,
+    pause=0.05,
+    lock_timeout="1s",
+    statement_timeout="30s",
+    on_batch=None,
+    bind=None,
+):
+    """Run ``UPDATE table SET assignments WHERE where`` in small transactions.
+
+    Rows are taken in order of the integer column ``key``, at most
+    ``batch_size`` at a time. Each batch commits together with its progress
+    under ``name``, so an interrupted backfill resumes where it stopped and a
+    finished one is not repeated. The batch size is halved when a batch takes
+    longer than ``target`` seconds and doubled again when it is fast, which
+    bounds how long a batch keeps its rows locked; batches that hit
+    ``lock_timeout`` are retried smaller. ``pause`` seconds between batches
+    leave room for the app's own queries.
+
+    Rows inserted while the backfill runs must already get the new value from
+    the app. ``on_batch(rows, seconds)`` is called after every batch. Returns
+    the number of rows updated by this call.
+    """
+    statement = text(
+        f"""
+        WITH batch AS (
+            SELECT {key} AS batch_key FROM {table}
+            WHERE {key} > :last ORDER BY {key} LIMIT :size
+        ), bounds AS (
+            SELECT max(batch_key) AS upper FROM batch
+        ), updated AS (
+            UPDATE {table} SET {assignments}
+            FROM batch
+            WHERE {table}.{key} = batch.batch_key{f" AND ({where})" if where else ""}
+            RETURNING 1
+        ), progress AS (
+            INSERT INTO {PROGRESS_TABLE} (name, last_key, rows, updated_at)
+            SELECT :name, upper, (SELECT count(*) FROM updated), now()
+            FROM bounds WHERE upper IS NOT NULL
+            ON CONFLICT (name) DO UPDATE SET
+                last_key = excluded.last_key,
+                rows = {PROGRESS_TABLE}.rows + excluded.rows,
+                updated_at = excluded.updated_at
+        )
+        SELECT upper, (SELECT count(*) FROM updated) FROM bounds
+        """
+    )
+
+    with autocommit(bind) as conn:
+        _progress_table(conn)
+        done = conn.execute(
+            text(f"SELECT last_key, finished_at FROM {PROGRESS_TABLE} WHERE name = :name"),
+            {"name": name},
+        ).first()
+        if done is not None and done.finished_at is not None:
+            return 0
+        last = done.last_key if done is not None else -(2**63)
+
+        conn.execute(
+            text(
+                "SELECT set_config('lock_timeout', :lock, false), "
+                "set_config('statement_timeout', :statement, false)"
+            ),
+            {"lock": lock_timeout, "statement": statement_timeout},
+        )
+        total = 0
+        size = batch_size
+        failures = 0
+        logged = time.monotonic()
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    upper, updated = conn.execute(
+                        statement, {"name": name, "last": last, "size": size}
+                    ).one()
+                except OperationalError as error:
+                    failures += 1
+                    if not _timed_out(error, (LOCK_NOT_AVAILABLE, QUERY_CANCELED)) or failures > 10:
+                        raise
+                    size = max(size // 2, min_batch_size)
+                    time.sleep(pause * 2**failures)
+                    continue
+
+                elapsed = time.monotonic() - started
+                failures = 0
+                if upper is None:
+                    break
+                last = upper
+                total += updated
+                if on_batch is not None:
+                    on_batch(updated, elapsed)
+
+                if elapsed > target:
+                    size = max(size // 2, min_batch_size)
+                elif elapsed < target / 2:
+                    size = min(size * 2, batch_size)
+
+                if time.monotonic() - logged > 10:
+                    current_app.logger.info("Backfill %s: %d rows so far, at %s %s", name, total, key, last)
+                    logged = time.monotonic()
+                time.sleep(pause)
+
+            conn.execute(
+                text(
+                    f"""
+                    INSERT INTO {PROGRESS_TABLE} (name, last_key, finished_at, updated_at)
+                    VALUES (:name, :last, now(), now())
+                    ON CONFLICT (name) DO UPDATE SET
+                        finished_at = excluded.finished_at,
+                        updated_at = excluded.updated_at
+                    """
+                ),
+                {"name": name, "last": last},
+            )
+        finally:
+            conn.execute(text("RESET lock_timeout; RESET statement_timeout"))
+    return total
+
+
+def reset_backfill(name, bind=None):
+    """Forget the progress of a backfill, e.g. in the migration's downgrade()."""
+    with autocommit(bind) as conn:
+        _progress_table(conn)
+        conn.execute(text(f"DELETE FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name})
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("online-migrations")
+def online_migrations_cli():
+    """Online schema change helpers (Postgres only)."""
+
+
+def bench_backfill(engine, rows, batch_size=10000, compare=False):
+    """Backfill a column of a scratch table of ``rows`` rows while another
+    connection keeps updating random rows, as the app would.
+
+    Returns a dict with the backfill's ``elapsed`` seconds, the seconds each
+    of its ``batches`` held its rows locked, and the ``waits`` of the
+    concurrent updates. With ``compare``, a single-transaction UPDATE is
+    timed first, as ``single_elapsed`` and ``single_waits``.
+    """
+    table = "online_migrations_bench"
+    engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        conn.execute(
+            text(f"CREATE UNLOGGED TABLE {table} (id bigint PRIMARY KEY, value int, copy int)")
+        )
+        conn.execute(
+            text(f"INSERT INTO {table} SELECT g, g % 1000, NULL FROM generate_series(1, :rows) g"),
+            {"rows": rows},
+        )
+        conn.execute(text(f"ANALYZE {table}"))
+
+    def probe(stop, waits):
+        with engine.connect() as conn:
+            while not stop.is_set():
+                started = time.monotonic()
+                conn.execute(
+                    text(f"UPDATE {table} SET value = value WHERE id = :id"),
+                    {"id": random.randint(1, rows)},
+                )
+                waits.append(time.monotonic() - started)
+                time.sleep(0.001)
+
+    def measure(run):
+        stop, waits = threading.Event(), []
+        thread = threading.Thread(target=probe, args=(stop, waits))
+        thread.start()
+        started = time.monotonic()
+        try:
+            run()
+        finally:
+            stop.set()
+            thread.join()
+        return time.monotonic() - started, waits
+
+    result = {}
+    try:
+        if compare:
+            with engine.connect() as conn:
+                result["single_elapsed"], result["single_waits"] = measure(
+                    lambda: conn.execute(text(f"UPDATE {table} SET copy = value"))
+                )
+                conn.execute(text(f"UPDATE {table} SET copy = NULL"))
+
+        batches = []
+        with engine.connect() as conn:
+            reset_backfill(table, bind=conn)
+            result["elapsed"], result["waits"] = measure(
+                lambda: backfill(
+                    table,
+                    table,
+                    "copy = value",
+                    where="copy IS NULL",
+                    batch_size=batch_size,
+                    on_batch=lambda updated, seconds: batches.append(seconds),
+                    bind=conn,
+                )
+            )
+            reset_backfill(table, bind=conn)
+        result["batches"] = batches
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    return result
+
+
+@online_migrations_cli.command("bench")
+@click.option("--rows", default=1000000, help="Rows in the scratch table.")
+@click.option("--batch-size", default=10000, help="Largest backfill batch.")
+@click.option("--compare", is_flag=True, help="Also time a single-transaction UPDATE.")
+def bench_command(rows, batch_size, compare):
+    """Backfill a column of a scratch table while another connection keeps
+    updating random rows, and report how long its updates had to wait for
+    the backfill's row locks."""
+    result = bench_backfill(db.engine, rows, batch_size, compare)
+    if compare:
+        click.echo(
+            f"Single UPDATE: {result['single_elapsed']:.1f}s, longest wait of a "
+            f"concurrent update {max(result['single_waits']) * 1000:.0f}ms"
+        )
+    batches, waits = result["batches"], result["waits"]
+    click.echo(
+        f"Backfill: {result['elapsed']:.1f}s in {len(batches)} batches, longest batch "
+        f"{max(batches) * 1000:.0f}ms, longest wait of a concurrent update "
+        f"{max(waits) * 1000:.0f}ms over {len(waits)} updates"
+    )
@@ -0,0 +1,160 @@
+from datetime import date
+
+import click
+from sqlalchemy import select, text, union_all
+
+from extensions import db
+from models import ArchivedShow, Show
+
+# shows is range partitioned by start_time into one table per month, named
+# shows_yYYYYmMM, plus shows_default for anything outside those ranges. Old
+# months are moved into shows_archive by archive_partitions().
+DEFAULT_PARTITION = "shows_default"
+
+
+def _month(day, offset=0):
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"shows_y{month.year}m{month.month:02d}"
+
+
+def shows_with_archive():
+    """Live and archived shows as one selectable, for past-show queries."""
+    return union_all(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.start_time),
+        select(
+            ArchivedShow.id,
+            ArchivedShow.venue_id,
+            ArchivedShow.artist_id,
+            ArchivedShow.start_time,
+        ),
+    ).subquery("all_shows")
+
+
+def list_partitions():
+    """Return ``(name, lower bound)`` of every monthly partition, oldest first."""
+    rows = db.session.execute(
+        text(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = 'shows'
+            """
+        )
+    ).scalars()
+    partitions = []
+    for name in rows:
+        if name == DEFAULT_PARTITION:
+            continue
+        partitions.append((name, date(int(name[7:11]), int(name[12:14]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(month):
+    """Create the partition for ``month`` unless it exists.
+
+    Rows for that month which already landed in the default partition are
+    moved into the new table before it is attached.
+    """
+    name = partition_name(month)
+    exists = db.session.execute(
+        text("SELECT to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if exists:
+        return False
+
+    bounds = {"lower": month, "upper": _month(month, 1)}
+    db.session.execute(
+        text(f"CREATE TABLE {name} (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    db.session.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE start_time >= :lower AND start_time < :upper
+                RETURNING id, venue_id, artist_id, start_time
+            )
+            INSERT INTO {name} (id, venue_id, artist_id, start_time)
+            SELECT id, venue_id, artist_id, start_time FROM moved
+            """
+        ),
+        bounds,
+    )
+    db.session.execute(
+        text(
+            f"ALTER TABLE shows ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['lower']}') TO ('{bounds['upper']}')"
+        )
+    )
+    db.session.commit()
+    return True
+
+
+def create_partitions(months_ahead=12):
+    """Make sure partitions exist from this month to ``months_ahead`` on."""
+    today = date.today()
+    return [
+        partition_name(_month(today, offset))
+        for offset in range(months_ahead + 1)
+        if create_partition(_month(today, offset))
+    ]
+
+
+def archive_partitions(before):
+    """Move whole months that end on or before ``before`` into shows_archive."""
+    archived = []
+    for name, lower in list_partitions():
+        if _month(lower, 1) > before:
+            break
+
+        db.session.execute(text(f"ALTER TABLE shows DETACH PARTITION {name}"))
+        db.session.execute(
+            text(
+                f"""
+                INSERT INTO shows_archive (id, venue_id, artist_id, start_time)
+                SELECT id, venue_id, artist_id, start_time FROM {name}
+                ORDER BY venue_id, start_time
+                """
+            )
+        )
+        db.session.execute(text(f"DROP TABLE {name}"))
+        db.session.commit()
+        archived.append(name)
+    return archived
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("partitions")
+def partitions_cli():
+    """Manage the monthly partitions of the shows table (Postgres only)."""
+
+
+@partitions_cli.command("create")
+@click.option("--months-ahead", default=12, help="Months to create in advance.")
+def create_command(months_ahead):
+    """Create upcoming monthly partitions; run this on a schedule."""
+    created = create_partitions(months_ahead)
+    click.echo(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+
+
+@partitions_cli.command("archive")
+@click.option(
+    "--before",
+    required=True,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Archive months that end on or before this date.",
+)
+def archive_command(before):
+    """Move old partitions into shows_archive."""
+    if before.date() > date.today():
+        raise click.BadParameter("only past months can be archived", param_hint="--before")
+    archived = archive_partitions(before.date())
+    click.echo(f"Archived {len(archived)} partitions: {', '.join(archived) or '-'}")
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from functools import wraps
+import math
+import threading
+import time
+
+import click
+from flask import current_app, request
+from werkzeug.exceptions import TooManyRequests
+
+from hooks import ProcessLocal
+
+
+# ----------------------------------------------------------------------------#
+# Token buckets.
+# ----------------------------------------------------------------------------#
+class MemoryBackend:
+    """Token buckets kept in this process.
+
+    Every worker process has its own buckets, so with N workers a client can
+    get up to N times the configured rate. The least recently used buckets
+    are dropped beyond ``size`` clients.
+    """
+
+    def __init__(self, size=100000):
+        self.size = size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token from ``key``'s bucket. Returns 0 when one was taken,
+        or the seconds until the next token otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.size:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBackend:
+    """Token buckets in Redis, shared by every worker and host."""
+
+    # Refill and take in one round trip; buckets expire once full again
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        # redis is optional and only needed when a shared backend is configured
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=["ratelimit:" + key], args=[rate, burst, time.time()]))
+
+
+# ----------------------------------------------------------------------------#
+# Limiter.
+# ----------------------------------------------------------------------------#
+class RateLimiter:
+    """Token bucket rate limits and concurrency caps for views.
+
+    ``@limiter.limit("search")`` applies the ``RATELIMIT_SEARCH`` policy, a
+    ``(requests per second, burst)`` pair, to every client per route. When
+    ``RATELIMIT_SEARCH_CONCURRENCY`` is set, at most that many requests of
+    the policy run at once in each process; further requests wait up to
+    ``RATELIMIT_SEARCH_QUEUE_TIMEOUT`` seconds for a slot and are then shed.
+    Limited requests get a 429 with a Retry-After header.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._lock = threading.Lock()
+        self._gates = ProcessLocal(dict)
+
+    def init_app(self, app):
+        app.extensions["ratelimit"] = self
+        app.cli.add_command(ratelimit_cli)
+
+        url = app.config["RATELIMIT_STORAGE_URL"]
+        if url:
+            self.backend = RedisBackend(url)
+        else:
+            self.backend = MemoryBackend(app.config["RATELIMIT_MAX_CLIENTS"])
+
+    def _gate(self, policy, size):
+        gates = self._gates.get()
+        with self._lock:
+            gate = gates.get(policy)
+            if gate is None:
+                gate = gates[policy] = threading.BoundedSemaphore(size)
+            return gate
+
+    def _admit(self, policy):
+        """Apply ``policy`` to the current request. Returns the semaphore to
+        release once the view is done, if any."""
+        config = current_app.config
+        if not config["RATELIMIT_ENABLED"]:
+            return None
+
+        rate, burst = config["RATELIMIT_" + policy.upper()]
+        key = f"{request.endpoint}:{request.remote_addr}"
+        wait = self.backend.take(key, rate, burst)
+        if wait:
+            raise TooManyRequests(retry_after=math.ceil(wait))
+
+        size = config.get(f"RATELIMIT_{policy.upper()}_CONCURRENCY")
+        if not size:
+            return None
+        gate = self._gate(policy, size)
+        timeout = config.get(f"RATELIMIT_{policy.upper()}_QUEUE_TIMEOUT", 0)
+        acquired = gate.acquire(timeout=timeout) if timeout else gate.acquire(blocking=False)
+        if not acquired:
+            current_app.logger.warning("Shedding %s request, %s slots busy", policy, size)
+            raise TooManyRequests(retry_after=1)
+        return gate
+
+    def limit(self, policy):
+        """Decorate a view with the limits of ``policy``."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                gate = self._admit(policy)
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    if gate is not None:
+                        gate.release()
+
+            return wrapper
+
+        return decorator
+
+
+limiter = RateLimiter()
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("ratelimit")
+def ratelimit_cli():
+    """Inspect the rate limiter."""
+
+
+@ratelimit_cli.command("bench")
+@click.option("--requests", default=100000, help="Token takes to time.")
+@click.option("--clients", default=1000, help="Distinct clients to spread them over.")
+def bench_command(requests, clients):
+    """Time the per-request cost of the configured backend."""
+    backend = limiter.backend
+    started = time.perf_counter()
+    for i in range(requests):
+        backend.take(f"bench:{i % clients}", 1000.0, 1000)
+    elapsed = time.perf_counter() - started
+    click.echo(f"{type(backend).__name__}: {elapsed / requests * 1e6:.2f}us per request")
@@ -0,0 +1,142 @@
+from collections import namedtuple
+import time
+import tracemalloc
+
+import click
+from sqlalchemy import select
+
+from extensions import db
+from models import Artist, Venue, artist_fields, venue_fields
+from tracing import span
+from utils import process_array
+
+# What the read routes render: plain tuples built from column-projected
+# queries. Unlike ORM entities they aren't tracked by a session, can't be
+# flushed by accident, and cost a tuple per row rather than an instance with
+# its state, __dict__ and identity map entry. The ORM is for writes.
+
+
+class ReadModel:
+    """Mixin for namedtuple read models of one table.
+
+    Fields named after columns of ``model`` are selected by ``select()``;
+    the others are filled in by ``load(row, **values)``. genres is loaded as
+    a list.
+    """
+
+    __slots__ = ()
+    model = None
+
+    @classmethod
+    def select(cls):
+        return select(
+            *(
+                getattr(cls.model, field)
+                for field in cls._fields
+                if field in cls.model.__table__.c
+            )
+        )
+
+    @classmethod
+    def load(cls, row, **values):
+        data = row._asdict()
+        if "genres" in data:
+            data["genres"] = process_array(data["genres"])
+        return cls(**data, **values)
+
+
+DETAIL_FIELDS = [
+    "upcoming_shows",
+    "upcoming_shows_count",
+    "past_shows",
+    "past_shows_count",
+    "past_shows_next",
+]
+
+
+class VenueDetail(
+    ReadModel,
+    namedtuple("VenueDetail", ["id", *venue_fields, *DETAIL_FIELDS, "similar_venues"]),
+):
+    __slots__ = ()
+    model = Venue
+
+
+class ArtistDetail(
+    ReadModel,
+    namedtuple(
+        "ArtistDetail",
+        ["id", *artist_fields, *DETAIL_FIELDS, "similar_artists", "recommended_venues"],
+    ),
+):
+    __slots__ = ()
+    model = Artist
+
+
+# What the edit forms are filled in from
+class VenueEdit(ReadModel, namedtuple("VenueEdit", ["id", "version", *venue_fields])):
+    __slots__ = ()
+    model = Venue
+
+
+class ArtistEdit(ReadModel, namedtuple("ArtistEdit", ["id", "version", *artist_fields])):
+    __slots__ = ()
+    model = Artist
+
+
+def fetch(query):
+    """Run ``query`` and return all its rows. Fetching them and building
+    the row objects is traced as an ``orm.hydrate`` span, next to the
+    ``sql`` span of the statement itself."""
+    result = db.session.execute(query)
+    with span("orm.hydrate") as hydrate:
+        rows = result.all()
+        hydrate.set("db.rows", len(rows))
+    return rows
+
+
+def init_app(app):
+    app.cli.add_command(read_models_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("read-models")
+def read_models_cli():
+    """Rows rendered by the read routes."""
+
+
+@read_models_cli.command("bench")
+@click.option("--rows", default=10000, help="Venues to load, at most.")
+def bench_command(rows):
+    """Load venues as ORM entities, the way the venue page used to, and as
+    read models, and report the time and peak memory of each."""
+
+    def entities():
+        venues = db.session.scalars(select(Venue).limit(rows)).all()
+        for venue in venues:
+            venue.genres = process_array(venue.genres)
+            venue.upcoming_shows = []
+        return venues
+
+    def read_models():
+        return [
+            VenueDetail.load(row, **dict.fromkeys(DETAIL_FIELDS), similar_venues=[])
+            for row in db.session.execute(VenueDetail.select().limit(rows))
+        ]
+
+    for name, load in (("ORM entities", entities), ("Read models", read_models)):
+        db.session.rollback()
+        tracemalloc.start()
+        started = time.perf_counter()
+        loaded = load()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        click.echo(
+            f"{name}: {len(loaded)} venues in {elapsed * 1000:.1f}ms, peak "
+            f"{peak / 1024:.0f}KiB, {len(db.session.identity_map)} in the identity map"
+        )
+        del loaded
+    db.session.rollback()
@@ -0,0 +1,328 @@
+from itertools import chain
+
+import click
+from flask import current_app
+from sqlalchemy import delete, func, insert, or_, select, type_coerce
+
+from extensions import db
+from jobs import jobs
+from models import Artist, Recommendation, Venue
+from partitions import shows_with_archive
+from utils import process_array
+
+# Rows of the score matrices computed at once, to bound memory on big builds
+CHUNK = 1000
+
+
+def _numpy():
+    # NumPy and SciPy are only needed by the jobs and commands that compute
+    # recommendations, not to serve them
+    import numpy
+    from scipy import sparse
+
+    return numpy, sparse
+
+
+# ----------------------------------------------------------------------------#
+# Loading.
+# ----------------------------------------------------------------------------#
+def _pairs(where=None):
+    # (artist_id, venue_id, number of shows), archived shows included
+    shows = shows_with_archive()
+    query = select(shows.c.artist_id, shows.c.venue_id, func.count()).group_by(
+        shows.c.artist_id, shows.c.venue_id
+    )
+    if where is not None:
+        query = query.where(where(shows.c))
+    return db.session.execute(query).all()
+
+
+def _genres(model, where=None):
+    query = select(model.id, model.genres)
+    if where is not None:
+        query = query.where(where)
+    return {
+        id: [genre for genre in process_array(genres) if genre] if genres else []
+        for id, genres in db.session.execute(query)
+    }
+
+
+def _shares_genre(model, genres):
+    # genres is stored as text like {Jazz,Blues}; a substring match may let
+    # in a few extra candidates, which only costs a little time
+    column = type_coerce(model.genres, db.String)
+    return or_(*(column.contains(genre, autoescape=True) for genre in sorted(genres)))
+
+
+class _Data:
+    """Shows and genres of some artists and venues as sparse matrices."""
+
+    def __init__(self, pairs, artist_genres, venue_genres):
+        numpy, sparse = _numpy()
+
+        self.artist_ids = sorted(set(artist_genres) | {a for a, _, _ in pairs})
+        self.venue_ids = sorted(set(venue_genres) | {v for _, v, _ in pairs})
+        self.artist_index = {id: i for i, id in enumerate(self.artist_ids)}
+        self.venue_index = {id: i for i, id in enumerate(self.venue_ids)}
+        genres = sorted(
+            set(chain.from_iterable(chain(artist_genres.values(), venue_genres.values())))
+        )
+        genre_index = {genre: i for i, genre in enumerate(genres)}
+
+        # Artists x venues, number of shows
+        self.shows = sparse.csr_matrix(
+            (
+                [float(count) for _, _, count in pairs],
+                (
+                    [self.artist_index[a] for a, _, _ in pairs],
+                    [self.venue_index[v] for _, v, _ in pairs],
+                ),
+            ),
+            shape=(len(self.artist_ids), len(self.venue_ids)),
+        )
+
+        def genre_matrix(ids, index, genres_by_id):
+            rows, cols = [], []
+            for id, values in genres_by_id.items():
+                for genre in set(values or ()):
+                    rows.append(index[id])
+                    cols.append(genre_index[genre])
+            return sparse.csr_matrix(
+                (numpy.ones(len(rows)), (rows, cols)), shape=(len(ids), len(genres))
+            )
+
+        self.artist_genres = genre_matrix(self.artist_ids, self.artist_index, artist_genres)
+        self.venue_genres = genre_matrix(self.venue_ids, self.venue_index, venue_genres)
+
+    def features(self, side):
+        """Unit-length rows of where each artist (or venue) played, damped
+        by log1p, next to its weighted genres."""
+        _, sparse = _numpy()
+        if side == "artists":
+            shows, genres = self.shows, self.artist_genres
+        else:
+            shows, genres = self.shows.T.tocsr(), self.venue_genres
+        weight = current_app.config["RECOMMENDATIONS_GENRE_WEIGHT"]
+        return _normalize(
+            sparse.hstack([_normalize(shows.log1p()), weight * _normalize(genres)]).tocsr()
+        )
+
+
+def _normalize(matrix):
+    numpy, sparse = _numpy()
+    norms = numpy.sqrt(numpy.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+# ----------------------------------------------------------------------------#
+# Scoring.
+# ----------------------------------------------------------------------------#
+def _top_k(scores, k, exclude):
+    """Best ``k`` ``(column, score)`` pairs of every row of ``scores``,
+    skipping zero scores and the columns in ``exclude[row]``."""
+    numpy, _ = _numpy()
+    results = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        cols, values = scores.indices[start:end], scores.data[start:end]
+        keep = (values > 0) & ~numpy.isin(cols, exclude[row])
+        cols, values = cols[keep], values[keep]
+        if len(values) > k:
+            best = numpy.argpartition(-values, k)[:k]
+            cols, values = cols[best], values[best]
+        order = numpy.lexsort((cols, -values))
+        results.append(list(zip(cols[order].tolist(), values[order].tolist())))
+    return results
+
+
+def _similar(features, rows, k):
+    # Cosine similarity of the given rows against every row
+    results = []
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start : start + CHUNK]
+        scores = (features[chunk] @ features.T).tocsr()
+        results += _top_k(scores, k, [[row] for row in chunk])
+    return results
+
+
+def _recommended_venues(data, rows, similar, k):
+    # Venues where similar artists played, weighted by similarity, plus
+    # genre overlap, leaving out the venues an artist already played
+    numpy, sparse = _numpy()
+    played = _normalize((data.shows > 0).astype(float))
+    artist_genres = _normalize(data.artist_genres)
+    venue_genres = _normalize(data.venue_genres)
+    weight = current_app.config["RECOMMENDATIONS_GENRE_WEIGHT"]
+
+    results = []
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start : start + CHUNK]
+        neighbours = similar[start : start + CHUNK]
+        similarity = sparse.csr_matrix(
+            (
+                [score for related in neighbours for _, score in related],
+                (
+                    [i for i, related in enumerate(neighbours) for _ in related],
+                    [col for related in neighbours for col, _ in related],
+                ),
+            ),
+            shape=(len(chunk), len(data.artist_ids)),
+        )
+        scores = (
+            similarity @ played + weight * (artist_genres[chunk] @ venue_genres.T)
+        ).tocsr()
+        results += _top_k(scores, k, [data.shows[row].indices for row in chunk])
+    return results
+
+
+def _store(kind, subject_ids, related_ids, results, replace_all=False):
+    query = delete(Recommendation).where(Recommendation.kind == kind)
+    if not replace_all:
+        query = query.where(Recommendation.subject_id.in_(subject_ids))
+    db.session.execute(query)
+
+    rows = [
+        {
+            "kind": kind,
+            "subject_id": subject_id,
+            "rank": rank,
+            "related_id": related_ids[col],
+            "score": score,
+        }
+        for subject_id, related in zip(subject_ids, results)
+        for rank, (col, score) in enumerate(related)
+    ]
+    if rows:
+        db.session.execute(insert(Recommendation), rows)
+
+
+# ----------------------------------------------------------------------------#
+# Builds.
+# ----------------------------------------------------------------------------#
+def build_recommendations():
+    """Recompute every recommendation from scratch."""
+    k = current_app.config["RECOMMENDATIONS_TOP_K"]
+    data = _Data(_pairs(), _genres(Artist), _genres(Venue))
+
+    artist_rows = list(range(len(data.artist_ids)))
+    similar_artists = _similar(data.features("artists"), artist_rows, k)
+    _store(
+        "similar_artists",
+        data.artist_ids,
+        data.artist_ids,
+        similar_artists,
+        replace_all=True,
+    )
+    _store(
+        "recommended_venues",
+        data.artist_ids,
+        data.venue_ids,
+        _recommended_venues(data, artist_rows, similar_artists, k),
+        replace_all=True,
+    )
+
+    venue_rows = list(range(len(data.venue_ids)))
+    _store(
+        "similar_venues",
+        data.venue_ids,
+        data.venue_ids,
+        _similar(data.features("venues"), venue_rows, k),
+        replace_all=True,
+    )
+    db.session.commit()
+    return len(artist_rows), len(venue_rows)
+
+
+def _neighbourhood(model, own, other, ids):
+    """Ids of ``ids`` and of everything that shares a show partner or a
+    genre with them, i.e. everything they can have a nonzero score with."""
+    shows = shows_with_archive()
+    partners = select(shows.c[other]).where(shows.c[own].in_(ids))
+    candidates = set(ids)
+    candidates.update(
+        db.session.scalars(
+            select(shows.c[own]).where(shows.c[other].in_(partners)).distinct()
+        )
+    )
+    genres = set(chain.from_iterable(_genres(model, model.id.in_(ids)).values()))
+    if genres:
+        candidates.update(
+            db.session.scalars(select(model.id).where(_shares_genre(model, genres)))
+        )
+    return candidates, genres
+
+
+@jobs.task
+def update_recommendations(artist_ids=(), venue_ids=()):
+    """Recompute the recommendations of some artists and venues, e.g. after
+    they got a new show.
+
+    Only the artists and venues that can score above zero against them are
+    loaded, so this costs a fraction of a full build. Other artists' and
+    venues' lists that mention them keep their old scores until the next
+    `flask recommendations build`.
+    """
+    k = current_app.config["RECOMMENDATIONS_TOP_K"]
+
+    if artist_ids:
+        candidates, genres = _neighbourhood(Artist, "artist_id", "venue_id", artist_ids)
+        pairs = _pairs(lambda c: c.artist_id.in_(candidates))
+        venues = Venue.id.in_({v for _, v, _ in pairs})
+        if genres:
+            venues |= _shares_genre(Venue, genres)
+        venue_genres = _genres(Venue, venues)
+        data = _Data(pairs, _genres(Artist, Artist.id.in_(candidates)), venue_genres)
+
+        rows = [data.artist_index[id] for id in artist_ids if id in data.artist_index]
+        subjects = [data.artist_ids[row] for row in rows]
+        similar = _similar(data.features("artists"), rows, k)
+        _store("similar_artists", subjects, data.artist_ids, similar)
+        _store(
+            "recommended_venues",
+            subjects,
+            data.venue_ids,
+            _recommended_venues(data, rows, similar, k),
+        )
+
+    if venue_ids:
+        candidates, _ = _neighbourhood(Venue, "venue_id", "artist_id", venue_ids)
+        pairs = _pairs(lambda c: c.venue_id.in_(candidates))
+        data = _Data(pairs, {}, _genres(Venue, Venue.id.in_(candidates)))
+
+        rows = [data.venue_index[id] for id in venue_ids if id in data.venue_index]
+        subjects = [data.venue_ids[row] for row in rows]
+        _store(
+            "similar_venues",
+            subjects,
+            data.venue_ids,
+            _similar(data.features("venues"), rows, k),
+        )
+
+    db.session.commit()
+
+
+def related(kind, subject_id):
+    """Select the related artists or venues of one subject, best first."""
+    model = Venue if kind.endswith("venues") else Artist
+    return (
+        select(model.id, model.name, model.image_link)
+        .join(Recommendation, Recommendation.related_id == model.id)
+        .where(Recommendation.kind == kind, Recommendation.subject_id == subject_id)
+        .order_by(Recommendation.rank)
+    )
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("recommendations")
+def recommendations_cli():
+    """Compute similar artists and venues (needs numpy and scipy)."""
+
+
+@recommendations_cli.command("build")
+def build_command():
+    """Recompute all recommendations; run this on a schedule, e.g. nightly."""
+    artists, venues = build_recommendations()
+    click.echo(f"Built recommendations for {artists} artists and {venues} venues.")
@@ -0,0 +1,353 @@
+from datetime import date
+import time
+
+import click
+from flask import current_app, render_template
+from sqlalchemy import (
+    BigInteger,
+    String,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    type_coerce,
+    union,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from extensions import db
+from jobs import jobs
+from models import Artist, Rollup, RollupDelta, Venue
+from partitions import shows_with_archive
+
+# Counters kept for the dashboard, as (metric, key) -> count:
+#
+#   shows_by_month    "YYYY-MM"       shows starting that month
+#   venue_shows       venue id        shows booked at the venue
+#   artist_shows      artist id       shows booked for the artist
+#   genre_state       "STATE:Genre"   shows in the state by artists of the genre
+#   venues, artists   "total"/"seeking"
+#
+# Writes append signed delta rows to rollup_deltas in their own transaction,
+# rather than updating counters, so they never wait on each other for a hot
+# row; compact_rollups() folds the deltas into rollups. The dashboard reads
+# both, and never the base tables.
+
+
+# ----------------------------------------------------------------------------#
+# Deltas.
+# ----------------------------------------------------------------------------#
+def _record(*queries):
+    # Each query selects (metric, key, delta) rows
+    db.session.execute(
+        insert(RollupDelta).from_select(["metric", "key", "delta"], union_all(*queries))
+    )
+
+
+def record_shows(where=None, sign=1):
+    """Count the shows matching ``where(columns)``, archived shows included.
+
+    Call it with ``sign=-1`` before changing a venue's state or an artist's
+    genres, and again with ``sign=1`` once the change is flushed.
+    """
+    shows = shows_with_archive()
+    amount = sign * func.count()
+
+    def query(metric, key):
+        query = select(literal(metric), key, amount).select_from(shows)
+        if where is not None:
+            query = query.where(where(shows.c))
+        return query.group_by(key)
+
+    genre = func.unnest(cast(type_coerce(Artist.genres, String), ARRAY(String)))
+    genres = (
+        select(
+            shows.c.id.label("show_id"),
+            Venue.state.label("state"),
+            genre.label("genre"),
+        )
+        .join(Venue, Venue.id == shows.c.venue_id)
+        .join(Artist, Artist.id == shows.c.artist_id)
+        .where(Venue.state.is_not(None))
+    )
+    if where is not None:
+        genres = genres.where(where(shows.c))
+    genres = genres.subquery()
+    state_genre = genres.c.state + ":" + genres.c.genre
+
+    _record(
+        query("shows_by_month", func.to_char(shows.c.start_time, "YYYY-MM")),
+        query("venue_shows", cast(shows.c.venue_id, String)),
+        query("artist_shows", cast(shows.c.artist_id, String)),
+        select(literal("genre_state"), state_genre, sign * func.count())
+        .where(genres.c.genre != "")
+        .group_by(state_genre),
+    )
+
+
+def _record_entities(model, seeking, where=None, sign=1):
+    metric = model.__tablename__
+
+    def query(key, *criteria):
+        query = select(literal(metric), literal(key), sign * func.count()).select_from(
+            model
+        )
+        if where is not None:
+            criteria += (where,)
+        return query.where(*criteria).having(func.count() > 0)
+
+    _record(query("total"), query("seeking", seeking.is_(True)))
+
+
+def record_venues(where=None, sign=1):
+    """Count the venues matching ``where``; with ``sign=-1`` before they are
+    deleted or their seeking_talent changes."""
+    _record_entities(Venue, Venue.seeking_talent, where, sign)
+
+
+def record_artists(where=None, sign=1):
+    _record_entities(Artist, Artist.seeking_venue, where, sign)
+
+
+# ----------------------------------------------------------------------------#
+# Compaction.
+# ----------------------------------------------------------------------------#
+@jobs.task
+def compact_rollups():
+    """Fold the pending deltas into rollups; run this on a schedule.
+
+    Concurrent runs each fold the deltas they deleted, so a delta is never
+    counted twice.
+    """
+    moved = (
+        delete(RollupDelta)
+        .returning(RollupDelta.metric, RollupDelta.key, RollupDelta.delta)
+        .cte("moved")
+    )
+    totals = (
+        select(moved.c.metric, moved.c.key, func.sum(moved.c.delta))
+        .group_by(moved.c.metric, moved.c.key)
+        # Upsert in key order, so that concurrent runs don't deadlock
+        .order_by(moved.c.metric, moved.c.key)
+    )
+    statement = pg_insert(Rollup).from_select(["metric", "key", "count"], totals)
+    statement = statement.on_conflict_do_update(
+        index_elements=["metric", "key"],
+        set_={"count": Rollup.count + statement.excluded.count},
+    ).add_cte(moved)
+    keys = db.session.execute(statement).rowcount
+    db.session.execute(delete(Rollup).where(Rollup.count == 0))
+    db.session.commit()
+    return keys
+
+
+def rebuild_rollups():
+    """Recompute every counter from the base tables."""
+    db.session.execute(delete(RollupDelta))
+    db.session.execute(delete(Rollup))
+    record_shows()
+    record_venues()
+    record_artists()
+    db.session.commit()
+    compact_rollups()
+
+
+# ----------------------------------------------------------------------------#
+# Reading.
+# ----------------------------------------------------------------------------#
+def _pending(metric):
+    return (
+        select(
+            RollupDelta.key, cast(func.sum(RollupDelta.delta), BigInteger).label("delta")
+        )
+        .where(RollupDelta.metric == metric)
+        .group_by(RollupDelta.key)
+        .cte(metric + "_pending")
+    )
+
+
+def counts(metric, where=None):
+    """{key: count} of a metric with a bounded number of keys."""
+    compacted = select(Rollup.key, Rollup.count).where(Rollup.metric == metric)
+    pending = select(RollupDelta.key, RollupDelta.delta).where(
+        RollupDelta.metric == metric
+    )
+    if where is not None:
+        compacted = compacted.where(where(Rollup.key))
+        pending = pending.where(where(RollupDelta.key))
+    rows = union_all(compacted, pending).subquery()
+    total = cast(func.sum(rows.c[1]), BigInteger)
+    # One statement, so a compaction can't commit between reading the two
+    return dict(
+        db.session.execute(
+            select(rows.c.key, total).group_by(rows.c.key).having(total != 0)
+        ).all()
+    )
+
+
+def counter(metric, key):
+    """The count of one key of a metric."""
+    key = str(key)
+    return counts(metric, lambda column: column == key).get(key, 0)
+
+
+def top(metric, limit):
+    """The ``limit`` keys of a metric with the highest counts, as (key, count).
+
+    Only keys with pending deltas can overtake the others, so it's enough
+    to look at those and at as many more of the compacted top counts, which
+    come from ix_rollups_metric_count.
+    """
+    pending = _pending(metric)
+    leaders = (
+        select(Rollup.key)
+        .where(Rollup.metric == metric)
+        .order_by(Rollup.count.desc())
+        .limit(limit + select(func.count()).select_from(pending).scalar_subquery())
+    )
+    candidates = union(leaders, select(pending.c.key)).subquery()
+    total = func.coalesce(Rollup.count, 0) + func.coalesce(pending.c.delta, 0)
+    return db.session.execute(
+        select(candidates.c.key, total.label("count"))
+        .outerjoin(Rollup, (Rollup.metric == metric) & (Rollup.key == candidates.c.key))
+        .outerjoin(pending, pending.c.key == candidates.c.key)
+        .where(total > 0)
+        .order_by(total.desc(), candidates.c.key)
+        .limit(limit)
+    ).all()
+
+
+def _top_named(metric, model, limit):
+    leaders = top(metric, limit)
+    names = dict(
+        db.session.execute(
+            select(model.id, model.name).where(
+                model.id.in_([int(key) for key, _ in leaders])
+            )
+        ).all()
+    )
+    return [(int(key), names.get(int(key)), count) for key, count in leaders]
+
+
+def dashboard_data():
+    config = current_app.config
+    limit = config["DASHBOARD_TOP_LIMIT"]
+
+    today = date.today()
+    months_back = config["DASHBOARD_MONTHS"] - 1
+    first = date(
+        today.year + (today.month - 1 - months_back) // 12,
+        (today.month - 1 - months_back) % 12 + 1,
+        1,
+    )
+    months = sorted(
+        counts("shows_by_month", lambda key: key >= first.strftime("%Y-%m")).items()
+    )
+
+    genres_by_state = {}
+    for key, count in counts("genre_state").items():
+        state, genre = key.split(":", 1)
+        genres_by_state.setdefault(state, []).append((genre, count))
+    for genres in genres_by_state.values():
+        genres.sort(key=lambda item: (-item[1], item[0]))
+        del genres[limit:]
+
+    def ratio(metric):
+        values = counts(metric)
+        total = values.get("total", 0)
+        seeking = values.get("seeking", 0)
+        return {"total": total, "seeking": seeking, "share": seeking / total if total else 0}
+
+    return {
+        "months": months,
+        "top_venues": _top_named("venue_shows", Venue, limit),
+        "top_artists": _top_named("artist_shows", Artist, limit),
+        "genres_by_state": sorted(genres_by_state.items()),
+        "venues": ratio("venues"),
+        "artists": ratio("artists"),
+    }
+
+
+def dashboard():
+    return render_template("pages/dashboard.html", **dashboard_data())
+
+
+def init_app(app):
+    if app.config["ADMIN_ENABLED"]:
+        app.add_url_rule("/admin/dashboard", "dashboard", dashboard)
+    app.cli.add_command(rollups_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("rollups")
+def rollups_cli():
+    """Maintain the dashboard counters."""
+
+
+@rollups_cli.command("compact")
+def compact_command():
+    """Fold pending deltas into the counters; run this on a schedule."""
+    click.echo(f"Compacted deltas into {compact_rollups()} counters.")
+
+
+@rollups_cli.command("rebuild")
+def rebuild_command():
+    """Recompute the counters from the base tables."""
+    rebuild_rollups()
+    click.echo("Rebuilt rollups.")
+
+
+@rollups_cli.command("bench")
+@click.option("--shows", default=100000, help="Shows to add before the second run.")
+@click.option("--repeat", default=20, help="Dashboard reads per run.")
+def bench_command(shows, repeat):
+    """Time the dashboard queries, add ``--shows`` scratch shows between two
+    existing venues and artists, and time them again. The scratch shows are
+    removed afterwards."""
+    from models import Show
+
+    def measure():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            dashboard_data()
+            db.session.rollback()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    venue_id = db.session.scalar(select(func.min(Venue.id)))
+    artist_id = db.session.scalar(select(func.min(Artist.id)))
+    if venue_id is None or artist_id is None:
+        raise click.ClickException("Add a venue and an artist first.")
+    base = db.session.scalar(select(func.count()).select_from(shows_with_archive()))
+    click.echo(f"{base} shows: dashboard {measure():.1f}ms")
+
+    last = db.session.scalar(select(func.max(shows_with_archive().c.id))) or 0
+    series = func.generate_series(1, shows).column_valued("n")
+    db.session.execute(
+        insert(Show).from_select(
+            ["venue_id", "artist_id", "start_time"],
+            select(
+                literal(venue_id),
+                literal(artist_id),
+                func.now() + series * literal_column("interval '1 minute'"),
+            ),
+        )
+    )
+    added = lambda c: c.id > last
+    try:
+        record_shows(added)
+        db.session.commit()
+        click.echo(f"{base + shows} shows, deltas pending: dashboard {measure():.1f}ms")
+        compact_rollups()
+        click.echo(f"{base + shows} shows, compacted: dashboard {measure():.1f}ms")
+    finally:
+        db.session.rollback()
+        record_shows(added, sign=-1)
+        db.session.execute(delete(Show).where(Show.id > last))
+        db.session.commit()
+        compact_rollups()
@@ -0,0 +1,107 @@
+from array import array
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+from flask import current_app, jsonify
+
+# Rough per-entry cost of the key tuple, the entry tuple and the dict slot
+ENTRY_OVERHEAD = 200
+
+
+def normalize_term(term):
+    """Collapse whitespace; searches match case-insensitively anyway."""
+    return " ".join((term or "").split())
+
+
+class SearchCache:
+    """LRU cache of search results, bounded by memory and age.
+
+    Entries map ``(entity, lowercased term)`` to the ids of the matching
+    rows, and are dropped after ``SEARCH_CACHE_TTL`` seconds or when the
+    cache grows past ``SEARCH_CACHE_MAX_BYTES``. Writes in this process call
+    ``invalidate()`` for their entity; writes in other processes are only
+    picked up once entries expire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        # Bumped by invalidate(), so that a search which started before a
+        # write doesn't store results from before it
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        app.extensions["search_cache"] = self
+        if app.config["ADMIN_ENABLED"]:
+            app.add_url_rule("/admin/search-cache", "search_cache", self.stats_view)
+
+    def generation(self, entity):
+        return self._generations.get(entity, 0)
+
+    def get(self, entity, term):
+        """Return the cached ids for ``term``, or None."""
+        key = (entity, term.lower())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, entity, term, ids, generation):
+        config = current_app.config
+        key = (entity, term.lower())
+        ids = array("q", ids)
+        size = ENTRY_OVERHEAD + sys.getsizeof(key[1]) + sys.getsizeof(ids)
+        if size > config["SEARCH_CACHE_MAX_BYTES"]:
+            return
+
+        with self._lock:
+            if generation != self.generation(entity):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + config["SEARCH_CACHE_TTL"], ids, size)
+            self._size += size
+            while self._size > config["SEARCH_CACHE_MAX_BYTES"]:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key)[2]
+
+    def invalidate(self, entity):
+        """Drop every cached search of ``entity``."""
+        with self._lock:
+            self._generations[entity] = self.generation(entity) + 1
+            for key in [key for key in self._entries if key[0] == entity]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    def stats_view(self):
+        # Counters are per process, like the cache itself
+        return jsonify(self.stats())
+
+
+search_cache = SearchCache()
@@ -0,0 +1,227 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import threading
+import time
+import unicodedata
+
+import click
+from flask import current_app
+from sqlalchemy import select
+
+from extensions import db
+from models import Artist, Venue
+
+
+def normalize(name):
+    """Case, accent and whitespace insensitive form of a name."""
+    if name.isascii():
+        return " ".join(name.lower().split())
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class PrefixIndex:
+    """In-memory prefix index of names, for autocomplete.
+
+    Normalized names are kept in a sorted list with the matching ids in a
+    parallel array, so a lookup is one bisect plus a scan over the matches.
+    It is loaded from the database once, before the server forks when the
+    app is preloaded, and every process keeps its copy current with
+    ``add()`` and ``remove()`` from its own write handlers. Writes made by
+    other processes show up when the copy is reloaded, in the background,
+    once it is older than ``SEARCH_INDEX_TTL`` seconds.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ids = array("q")
+        self._names = {}
+        self._loaded_at = None
+        self._reloading = False
+
+    def __contains__(self, id):
+        self._ensure_loaded()
+        return id in self._names
+
+    def exists(self, id):
+        """Whether a row with ``id`` exists, answered from memory for every
+        indexed id. Misses are checked against the database, in case another
+        process created the row since the last reload."""
+        if id in self:
+            return True
+        name = db.session.scalar(select(self.model.name).where(self.model.id == id))
+        if name is None:
+            return False
+        self.add(id, name)
+        return True
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._names)
+
+    # ------------------------------------------------------------------------#
+    # Loading.
+    # ------------------------------------------------------------------------#
+    def _read(self, rows):
+        entries = sorted((normalize(name), id, name) for id, name in rows)
+        keys = [key for key, _, _ in entries]
+        ids = array("q", [id for _, id, _ in entries])
+        names = {id: name for _, id, name in entries}
+        return keys, ids, names
+
+    def load(self, rows):
+        """Replace the contents with ``(id, name)`` rows."""
+        keys, ids, names = self._read(rows)
+        with self._lock:
+            self._keys, self._ids, self._names = keys, ids, names
+            self._loaded_at = time.monotonic()
+            self._reloading = False
+
+    def _query(self):
+        return db.session.execute(select(self.model.id, self.model.name)).all()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            # Loaded lazily when nothing warmed the index up
+            self.load(self._query())
+            return
+
+        ttl = current_app.config["SEARCH_INDEX_TTL"]
+        if ttl and not self._reloading and time.monotonic() - self._loaded_at > ttl:
+            self._reloading = True
+            app = current_app._get_current_object()
+            threading.Thread(target=self._reload, args=(app,), daemon=True).start()
+
+    def _reload(self, app):
+        with app.app_context():
+            try:
+                self.load(self._query())
+            except Exception:
+                self._reloading = False
+                app.logger.exception("Could not reload the %s index", self.model.__tablename__)
+            finally:
+                db.session.remove()
+
+    # ------------------------------------------------------------------------#
+    # Updates.
+    # ------------------------------------------------------------------------#
+    def _remove(self, id):
+        name = self._names.pop(id, None)
+        if name is None:
+            return
+        position = bisect_left(self._keys, normalize(name))
+        while self._ids[position] != id:
+            position += 1
+        del self._keys[position]
+        del self._ids[position]
+
+    def add(self, id, name):
+        """Insert ``id``, or rename it if it is already indexed."""
+        self._ensure_loaded()
+        key = normalize(name)
+        with self._lock:
+            self._remove(id)
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, id)
+            self._names[id] = name
+
+    def remove(self, id):
+        self._ensure_loaded()
+        with self._lock:
+            self._remove(id)
+
+    # ------------------------------------------------------------------------#
+    # Lookups.
+    # ------------------------------------------------------------------------#
+    def search(self, prefix, limit=10):
+        """Return up to ``limit`` ``(id, name)`` pairs whose name starts with
+        ``prefix``, in alphabetical order."""
+        self._ensure_loaded()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        with self._lock:
+            keys = self._keys
+            position = bisect_left(keys, prefix)
+            end = min(position + limit, len(keys))
+            while position < end and keys[position].startswith(prefix):
+                id = self._ids[position]
+                results.append((id, self._names[id]))
+                position += 1
+        return results
+
+
+artists = PrefixIndex(Artist)
+venues = PrefixIndex(Venue)
+
+
+def warm():
+    """Load both indexes now rather than on the first request."""
+    for index in (artists, venues):
+        index.load(index._query())
+
+
+def init_app(app):
+    app.cli.add_command(search_index_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("search-index")
+def search_index_cli():
+    """Inspect the autocomplete indexes."""
+
+
+@search_index_cli.command("stats")
+@click.option("--size", default=0, help="Measure a synthetic index of this many names.")
+def stats_command(size):
+    """Report build time, memory use and lookup time of an index."""
+    import random
+    import string
+    import tracemalloc
+
+    if size:
+        random.seed(0)
+        words = string.ascii_lowercase
+        rows = [
+            (
+                id,
+                " ".join(
+                    "".join(random.choices(words, k=random.randint(3, 9))).title()
+                    for _ in range(random.randint(1, 4))
+                ),
+            )
+            for id in range(size)
+        ]
+    else:
+        rows = artists._query() + venues._query()
+
+    index = PrefixIndex(None)
+    started = time.perf_counter()
+    index.load(rows)
+    built = time.perf_counter() - started
+
+    # Tracing slows loading down, so measure memory on a second load
+    index = PrefixIndex(None)
+    tracemalloc.start()
+    index.load(rows)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    prefixes = [name[:3] for _, name in rows[:10000]] or ["a"]
+    started = time.perf_counter()
+    for prefix in prefixes:
+        index.search(prefix)
+    lookup = (time.perf_counter() - started) / len(prefixes)
+
+    click.echo(f"Names:  {len(rows)}")
+    click.echo(f"Build:  {built:.2f}s")
+    click.echo(f"Memory: {memory / 2 ** 20:.1f} MiB")
+    click.echo(f"Lookup: {lookup * 1e6:.1f}us for the top 10")
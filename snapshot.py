@@ -0,0 +1,185 @@
+from datetime import datetime
+import fcntl
+import json
+import os
+import tempfile
+
+import click
+from flask import current_app
+from sqlalchemy import func, select
+
+from extensions import db
+from jobs import jobs
+from models import UpcomingShow, Venue
+
+
+class Snapshot:
+    """A read model published to a file that every worker process reads.
+
+    ``build()`` runs the expensive queries once and returns ``(data,
+    expires)``; ``publish()`` writes the result to a new file and renames it
+    over the current one, so each publish is a new generation that readers
+    see whole or not at all. Readers only ``stat()`` the file per request and
+    decode it again when its generation changed, without taking any lock.
+    The queries run once per generation rather than once per worker, and
+    each worker keeps just the one decoded copy it last read. For 20,000
+    venues that copy is about 28 MB per worker; mapping the file and
+    decoding items as pages use them saved only a quarter of it, and took
+    longer on every request than rendering the page.
+    """
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+        # (file identity, decoded snapshot) of the generation last read by
+        # this process; replaced as a whole, so reads need no lock
+        self._current = (None, None)
+
+    def _path(self):
+        return os.path.join(current_app.config["SNAPSHOT_DIR"], self.name + ".json")
+
+    def _fresh(self, snapshot):
+        return snapshot is not None and (
+            snapshot["expires"] is None
+            or datetime.fromisoformat(snapshot["expires"]) > datetime.now()
+        )
+
+    def publish(self, unless_fresh=False):
+        """Build and publish a new generation, and return it.
+
+        With ``unless_fresh``, a generation that another process published
+        while this one waited for the lock is returned instead.
+        """
+        path = self._path()
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Writers are serialized so that an older build can't replace a newer one
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            previous = self.read()
+            if unless_fresh and self._fresh(previous):
+                return previous
+
+            data, expires = self.build()
+            snapshot = {
+                "generation": previous["generation"] + 1 if previous else 1,
+                "published": datetime.now().isoformat(),
+                "expires": expires.isoformat() if expires else None,
+                "data": data,
+            }
+
+            fd, temp = tempfile.mkstemp(dir=directory, prefix=self.name + ".")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")).encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        return snapshot
+
+    def read(self):
+        """Return the current generation, or None if nothing was published."""
+        try:
+            stat = os.stat(self._path())
+        except FileNotFoundError:
+            return None
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        current = self._current
+        if current[0] == identity:
+            return current[1]
+
+        with open(self._path(), "rb") as f:
+            snapshot = json.loads(f.read())
+            # The file may have been replaced since the stat() above
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._current = (identity, snapshot)
+        return snapshot
+
+    def get(self):
+        """Return the data of the current generation, publishing one first
+        when there is none yet or it has expired."""
+        snapshot = self.read()
+        if not self._fresh(snapshot):
+            snapshot = self.publish(unless_fresh=True)
+        return snapshot["data"]
+
+
+# ----------------------------------------------------------------------------#
+# Snapshots.
+# ----------------------------------------------------------------------------#
+def build_venue_directory():
+    # Venues grouped by city and state, with their number of upcoming shows
+    now = datetime.now()
+    upcoming = (
+        select(
+            UpcomingShow.venue_id,
+            func.count().label("count"),
+            func.min(UpcomingShow.start_time).label("next"),
+        )
+        .where(UpcomingShow.start_time > now)
+        .group_by(UpcomingShow.venue_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            func.coalesce(upcoming.c.count, 0),
+            upcoming.c.next,
+        )
+        .outerjoin(upcoming, upcoming.c.venue_id == Venue.id)
+        .order_by(Venue.state, Venue.city, Venue.id)
+    )
+
+    areas = []
+    by_area = {}
+    # The counts go stale when the next show starts
+    expires = None
+    for id, name, city, state, num_upcoming_shows, next_show in rows:
+        area = by_area.get((city, state))
+        if area is None:
+            area = by_area[(city, state)] = {"city": city, "state": state, "venues": []}
+            areas.append(area)
+        area["venues"].append(
+            {"id": id, "name": name, "num_upcoming_shows": num_upcoming_shows}
+        )
+        if next_show is not None and (expires is None or next_show < expires):
+            expires = next_show
+    return areas, expires
+
+
+venue_directory = Snapshot("venue_directory", build_venue_directory)
+
+snapshots = {snapshot.name: snapshot for snapshot in (venue_directory,)}
+
+
+@jobs.task
+def publish_snapshot(name):
+    snapshots[name].publish()
+
+
+def init_app(app):
+    if not app.config.get("SNAPSHOT_DIR"):
+        app.config["SNAPSHOT_DIR"] = os.path.join(app.instance_path, "snapshots")
+    app.cli.add_command(snapshot_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("snapshot")
+def snapshot_cli():
+    """Publish the shared read model snapshots."""
+
+
+@snapshot_cli.command("publish")
+def publish_command():
+    """Publish a new generation of every snapshot, e.g. after a deploy."""
+    for snapshot in snapshots.values():
+        published = snapshot.publish()
+        click.echo(f"Published {snapshot.name} generation {published['generation']}.")
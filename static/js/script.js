@@ -2,3 +2,39 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Suggest names from the autocomplete endpoints while typing in a search box,
+// or IDs by name in the inputs marked data-autocomplete-value="id"
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  input.addEventListener('input', function () {
+    var q = input.value;
+    fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(q))
+      .then(function (response) { return response.json(); })
+      .then(function (matches) {
+        if (input.value !== q) return;
+        list.innerHTML = '';
+        matches.forEach(function (match) {
+          var option = document.createElement('option');
+          if (input.dataset.autocompleteValue === 'id') {
+            option.value = match.id;
+            option.label = match.name;
+          } else {
+            option.value = match.name;
+          }
+          list.appendChild(option);
+        });
+      });
+  });
+});
+
+// Replace a "load more" link with the HTML fragment it points at
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('a[data-fragment]');
+  if (!link) return;
+  event.preventDefault();
+  var container = link.closest('.load-more');
+  fetch(link.href)
+    .then(function (response) { return response.text(); })
+    .then(function (html) { container.outerHTML = html; });
+});
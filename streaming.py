@@ -0,0 +1,221 @@
+import time
+import zlib
+
+import click
+from flask import (
+    Response,
+    current_app,
+    g,
+    get_flashed_messages,
+    stream_template,
+)
+from werkzeug.http import parse_accept_header
+
+from extensions import db
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Rendered in place of {{ flush() }} while streaming, and never sent
+FLUSH = "\0flush\0"
+
+COMPRESSIBLE = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+}
+
+
+# ----------------------------------------------------------------------------#
+# Streamed pages.
+# ----------------------------------------------------------------------------#
+def stream_page(template_name, **context):
+    """Like ``render_template``, but send the page while it renders.
+
+    Output is sent at every ``{{ flush() }}`` in the templates, e.g. once the
+    layout head is rendered so that the browser can start fetching assets,
+    and then in chunks of ``STREAM_CHUNK_SIZE`` bytes. Pass query results
+    from ``stream_rows()`` so rows are rendered as they arrive.
+    """
+    # The session cookie is sent before the body, so flashed messages have to
+    # be taken from it now rather than while the layout renders
+    get_flashed_messages()
+    g.streaming = True
+    chunks = stream_template(template_name, **context)
+    return Response(
+        _buffered(chunks, current_app.config["STREAM_CHUNK_SIZE"]),
+        mimetype="text/html",
+    )
+
+
+def stream_rows(statement):
+    """Rows of ``statement``, queried once the template first loops over them
+    and fetched ``STREAM_BATCH_SIZE`` at a time from a server-side cursor."""
+    yield from db.session.execute(
+        statement.execution_options(
+            yield_per=current_app.config["STREAM_BATCH_SIZE"]
+        )
+    )
+
+
+def _buffered(chunks, size):
+    # Jinja yields many small strings; send them in fewer, larger writes
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        if chunk == FLUSH:
+            if buffer:
+                yield "".join(buffer)
+                buffer, length = [], 0
+            continue
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def flush():
+    """Template global: mark a point where a streamed page is sent so far."""
+    return FLUSH if g.get("streaming") else ""
+
+
+# ----------------------------------------------------------------------------#
+# Compression.
+# ----------------------------------------------------------------------------#
+class CompressionMiddleware:
+    """WSGI middleware that compresses text responses with brotli or gzip.
+
+    Every chunk the app yields is compressed and flushed on its own, so a
+    streamed page reaches the client as it renders. Responses that are
+    small, already encoded or not text are passed through.
+    """
+
+    def __init__(self, app, level=6, brotli_quality=5, min_size=500):
+        self.app = app
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.min_size = min_size
+
+    def __call__(self, environ, start_response):
+        # Quality 0 means not acceptable, e.g. "br;q=0, gzip"
+        accepted = parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"))
+        if brotli is not None and accepted["br"]:
+            encoding = "br"
+        elif accepted["gzip"]:
+            encoding = "gzip"
+        else:
+            return self.app(environ, start_response)
+
+        compress = False
+
+        def start(status, headers, exc_info=None):
+            nonlocal compress
+            names = {name.lower(): value for name, value in headers}
+            mimetype = names.get("content-type", "").split(";")[0].strip()
+            length = names.get("content-length")
+            compress = (
+                status.startswith("200")
+                and mimetype in COMPRESSIBLE
+                and "content-encoding" not in names
+                and (length is None or int(length) >= self.min_size)
+                and environ["REQUEST_METHOD"] != "HEAD"
+            )
+            if compress:
+                headers = [
+                    (name, value)
+                    for name, value in headers
+                    if name.lower() not in ("content-length", "vary")
+                ]
+                vary = names.get("vary")
+                headers.append(
+                    ("Vary", vary + ", Accept-Encoding" if vary else "Accept-Encoding")
+                )
+                headers.append(("Content-Encoding", encoding))
+            return start_response(status, headers, exc_info)
+
+        body = self.app(environ, start)
+        if not compress:
+            return body
+        return self._compress(body, encoding)
+
+    def _compress(self, body, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+            process = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+
+        try:
+            for chunk in body:
+                data = process(chunk) + flush()
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+
+def init_app(app):
+    app.jinja_env.globals["flush"] = flush
+    config = app.config
+    if config["COMPRESS_RESPONSES"]:
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            level=config["COMPRESS_LEVEL"],
+            brotli_quality=config["COMPRESS_BROTLI_QUALITY"],
+            min_size=config["COMPRESS_MIN_SIZE"],
+        )
+    app.cli.add_command(streaming_cli)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("streaming")
+def streaming_cli():
+    """Streamed and compressed responses."""
+
+
+@streaming_cli.command("bench")
+@click.argument("paths", nargs=-1)
+@click.option("--repeat", default=5, help="Requests per path and encoding.")
+def bench_command(paths, repeat):
+    """Time to first byte, total time and bytes sent for some pages, e.g.
+    `flask streaming bench /shows /artists /venues`."""
+    client = current_app.test_client()
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    for path in paths or ("/shows", "/artists", "/venues"):
+        for encoding in encodings:
+            ttfb = total = size = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = client.get(
+                    path, headers={"Accept-Encoding": encoding}, buffered=False
+                )
+                first = None
+                size = 0
+                for chunk in response.response:
+                    if first is None:
+                        first = time.perf_counter()
+                    size += len(chunk)
+                end = time.perf_counter()
+                response.close()
+                ttfb += (first or end) - start
+                total += end - start
+            click.echo(
+                f"{path} {encoding}: first byte {ttfb / repeat * 1000:.1f}ms, "
+                f"total {total / repeat * 1000:.1f}ms, {size} bytes"
+            )
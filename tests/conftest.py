@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    """A scratch Postgres database for tests that need one; they are
+    skipped unless TEST_DATABASE_URL is set."""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("set TEST_DATABASE_URL to a Postgres database to run this test")
+    return url
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on an in-memory SQLite database, with its context pushed.
+    Tables are left for each test to create, since the Postgres-only column
+    types of some models don't exist in SQLite."""
+    from app import create_app
+    from extensions import db
+
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "SEARCH_INDEX_PRELOAD": False,
+            "JOBS_EAGER": True,
+            "LOG_FILE": "",
+            "SNAPSHOT_DIR": str(tmp_path / "snapshots"),
+        }
+    )
+    with app.app_context():
+        yield app
+        db.session.remove()
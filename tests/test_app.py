@@ -0,0 +1,37 @@
+import pytest
+from flask import request
+
+from app import create_app
+
+
+def make_app(tmp_path, **config):
+    return create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "SEARCH_INDEX_PRELOAD": False,
+            "LOG_FILE": "",
+            "SNAPSHOT_DIR": str(tmp_path),
+            **config,
+        }
+    )
+
+
+@pytest.mark.parametrize("hops, expected", [(0, "10.0.0.1"), (1, "203.0.113.9")])
+def test_client_address_behind_proxies(tmp_path, hops, expected):
+    app = make_app(tmp_path, PROXY_HOPS=hops)
+    app.add_url_rule("/address", "address", lambda: request.remote_addr)
+
+    response = app.test_client().get(
+        "/address",
+        headers={"X-Forwarded-For": "198.51.100.7, 203.0.113.9"},
+        environ_base={"REMOTE_ADDR": "10.0.0.1"},
+    )
+    assert response.text == expected
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_admin_pages_are_off_by_default(tmp_path, enabled):
+    app = make_app(tmp_path, ADMIN_ENABLED=enabled)
+    routes = {rule.rule for rule in app.url_map.iter_rules()}
+    assert ("/admin/dashboard" in routes) is enabled
+    assert ("/admin/search-cache" in routes) is enabled
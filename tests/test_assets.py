@@ -0,0 +1,87 @@
+import gzip
+import json
+import re
+
+import brotli
+import pytest
+
+from assets import IMMUTABLE, asset_url, build_assets
+
+CSS = b"body { background: url('../img/bg.png?v=1'); }"
+JS = b"console.log('fyyur');" * 20
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def static(app, tmp_path):
+    """A small static folder in place of the app's own."""
+    folder = tmp_path / "static"
+    for name, content in (("css/main.css", CSS), ("js/app.js", JS), ("img/bg.png", PNG)):
+        (folder / name).parent.mkdir(parents=True, exist_ok=True)
+        (folder / name).write_bytes(content)
+    app.static_folder = str(folder)
+    app.extensions.pop("assets", None)
+    return folder
+
+
+def test_build_fingerprints_and_precompresses(static):
+    manifest = build_assets(str(static))
+    dist = static / "dist"
+
+    assert set(manifest) == {"css/main.css", "js/app.js", "img/bg.png"}
+    assert re.fullmatch(r"js/app\.[0-9a-f]{12}\.js", manifest["js/app.js"])
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+
+    js = dist / manifest["js/app.js"]
+    assert js.read_bytes() == JS
+    assert gzip.decompress((dist / (manifest["js/app.js"] + ".gz")).read_bytes()) == JS
+    assert brotli.decompress((dist / (manifest["js/app.js"] + ".br")).read_bytes()) == JS
+
+    # Images are already compressed
+    assert (dist / manifest["img/bg.png"]).exists()
+    assert not (dist / (manifest["img/bg.png"] + ".gz")).exists()
+
+    # Stylesheets point at the fingerprinted files they reference
+    css = (dist / manifest["css/main.css"]).read_bytes()
+    assert ("../" + manifest["img/bg.png"] + "?v=1").encode() in css
+
+
+def test_fingerprint_changes_with_the_content(static):
+    before = build_assets(str(static))["js/app.js"]
+    (static / "js/app.js").write_bytes(JS + b"\n")
+    assert build_assets(str(static))["js/app.js"] != before
+
+
+def test_asset_url_falls_back_to_static_until_built(app, static):
+    with app.test_request_context():
+        assert asset_url("js/app.js") == "/static/js/app.js"
+        app.extensions.pop("assets")
+        manifest = build_assets(str(static))
+        assert asset_url("js/app.js") == "/assets/" + manifest["js/app.js"]
+
+
+@pytest.mark.parametrize(
+    "accept, encoding",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("", None),
+    ],
+)
+def test_serve_picks_the_precompressed_variant(app, static, accept, encoding):
+    url = "/assets/" + build_assets(str(static))["js/app.js"]
+    response = app.test_client().get(url, headers={"Accept-Encoding": accept})
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == encoding
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.mimetype in ("text/javascript", "application/javascript")
+    body = response.get_data()
+    if encoding == "br":
+        body = brotli.decompress(body)
+    elif encoding == "gzip":
+        body = gzip.decompress(body)
+    assert body == JS
+    response.close()
@@ -0,0 +1,47 @@
+import os
+
+from sqlalchemy import create_engine, event, text
+import pytest
+
+from extensions import db
+from hooks import ProcessLocal, listen_once
+
+
+def test_listen_once_adds_a_listener_once():
+    engine = create_engine("sqlite://")
+    calls = []
+
+    def count(*args):
+        calls.append(args)
+
+    for _ in range(3):
+        listen_once(engine, "before_cursor_execute", count)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert len(calls) == 1
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def test_process_local_builds_once_per_process():
+    built = []
+    local = ProcessLocal(lambda n: built.append(n) or n)
+    assert local.peek() is None
+    assert local.get(1) == 1
+    assert local.get(2) == 1
+    assert built == [1]
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, b"%d %d" % (local.peek() is None, local.get(3)))
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 16) == b"1 3"
+    assert local.get(4) == 1
+
+
+def test_failed_statements_are_not_left_timed(app):
+    with db.engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info.get("query_started") == []
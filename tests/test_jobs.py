@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from extensions import db
+from jobs import jobs
+from models import Job
+
+calls = []
+
+
+@jobs.task
+def flaky_task(failures):
+    calls.append(failures)
+    if len(calls) <= failures:
+        raise RuntimeError("attempt %d failed" % len(calls))
+
+
+@pytest.fixture(autouse=True)
+def jobs_table(app):
+    calls.clear()
+    Job.__table__.create(db.engine)
+
+
+def test_eager_job_runs_after_commit(app):
+    jobs.enqueue(flaky_task, failures=0)
+    assert calls == []
+    db.session.commit()
+    assert calls == [0]
+    assert db.session.query(Job).count() == 0
+
+
+def test_eager_retries_skip_the_backoff(app):
+    app.config["JOBS_BACKOFF"] = 10.0
+    started = time.monotonic()
+    jobs.enqueue(flaky_task, failures=2)
+    db.session.commit()
+    assert time.monotonic() - started < 1
+    assert len(calls) == 3
+    assert db.session.query(Job).count() == 0
+
+
+def test_job_fails_after_max_attempts(app):
+    app.config["JOBS_MAX_ATTEMPTS"] = 3
+    jobs.enqueue(flaky_task, failures=10)
+    db.session.commit()
+    job = db.session.query(Job).one()
+    assert (job.status, job.attempts) == ("failed", 3)
+    assert "attempt 3 failed" in job.last_error
+
+
+def test_rolled_back_jobs_never_run(app):
+    jobs.enqueue(flaky_task, failures=0)
+    db.session.rollback()
+    db.session.commit()
+    assert calls == []
+    assert db.session.query(Job).count() == 0
+
+
+def test_unknown_tasks_are_rejected(app):
+    with pytest.raises(KeyError):
+        jobs.enqueue("no_such_task")
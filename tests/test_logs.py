@@ -0,0 +1,45 @@
+import logging
+import time
+
+from flask import Response, stream_with_context
+from sqlalchemy import text
+
+from extensions import db
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_streamed_requests_are_logged_once_sent(app):
+    app.config.update(LOG_SAMPLE_RATE=1.0, LOG_SLOW_REQUEST_MS=10000)
+
+    def streamed():
+        def body():
+            yield "head"
+            for _ in range(3):
+                db.session.execute(text("SELECT 1"))
+                time.sleep(0.01)
+                yield "row"
+
+        return Response(stream_with_context(body()))
+
+    app.add_url_rule("/streamed", "streamed", streamed)
+    records = Records()
+    app.logger.addHandler(records)
+    try:
+        response = app.test_client().get("/streamed")
+        assert records.records == []
+        assert response.text == "headrowrowrow"
+        response.close()
+    finally:
+        app.logger.removeHandler(records)
+
+    [record] = records.records
+    assert (record.status, record.queries, record.route) == (200, 3, "/streamed")
+    assert record.duration_ms >= 30
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from online_migrations import bench_backfill, lock_retries
+
+
+@pytest.fixture
+def pg_app(database_url, tmp_path):
+    from app import create_app
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": database_url,
+            "SEARCH_INDEX_PRELOAD": False,
+            "LOG_FILE": "",
+            "SNAPSHOT_DIR": str(tmp_path),
+        }
+    )
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def test_backfill_of_a_million_rows_holds_locks_briefly(pg_app):
+    result = bench_backfill(db.engine, 1000000)
+    # Each batch holds its rows locked until it commits
+    assert len(result["batches"]) >= 100
+    assert max(result["batches"]) < 1.0
+    assert max(result["waits"]) < 1.0
+
+
+def test_lock_retries_restores_lock_timeout(pg_app):
+    with db.engine.connect() as conn:
+        conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        lock_retries(lambda: conn.execute(text("SELECT 1")), lock_timeout="100ms", bind=conn)
+        assert conn.execute(text("SHOW lock_timeout")).scalar() == "5s"
+        conn.rollback()
+
+
+def test_lock_retries_waits_out_a_held_lock(pg_app):
+    engine = db.engine
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS lock_retries_test (id int)"))
+
+    locked = threading.Event()
+
+    def hold():
+        with engine.connect() as holder:
+            holder.execute(text("LOCK TABLE lock_retries_test"))
+            locked.set()
+            holder.execute(text("SELECT pg_sleep(0.3)"))
+            holder.rollback()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    assert locked.wait(5)
+    try:
+        attempts = []
+
+        def alter():
+            attempts.append(1)
+            conn.execute(text("ALTER TABLE lock_retries_test ADD COLUMN x int"))
+
+        with engine.connect() as conn:
+            lock_retries(alter, lock_timeout="50ms", backoff=0.05, bind=conn)
+            conn.rollback()
+        assert len(attempts) > 1
+    finally:
+        thread.join()
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE lock_retries_test"))
@@ -0,0 +1,22 @@
+from ratelimit import MemoryBackend
+
+
+def test_bucket_allows_a_burst_then_waits(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: now[0])
+    backend = MemoryBackend()
+
+    assert [backend.take("client", 2.0, 3) for _ in range(3)] == [0, 0, 0]
+    assert backend.take("client", 2.0, 3) == 0.5
+    assert backend.take("other", 2.0, 3) == 0
+
+    now[0] += 0.5
+    assert backend.take("client", 2.0, 3) == 0
+    assert backend.take("client", 2.0, 3) == 0.5
+
+
+def test_least_recently_used_clients_are_dropped():
+    backend = MemoryBackend(size=2)
+    for key in ("a", "b", "a", "c"):
+        backend.take(key, 1.0, 1)
+    assert list(backend._buckets) == ["a", "c"]
@@ -0,0 +1,25 @@
+from collections import namedtuple
+
+from models import venue_fields
+from read_models import DETAIL_FIELDS, VenueDetail, VenueEdit
+
+
+def test_select_takes_only_columns():
+    selected = [column.name for column in VenueDetail.select().selected_columns]
+    assert selected == ["id", *venue_fields]
+    assert not set(DETAIL_FIELDS) & set(selected)
+
+
+def test_load_splits_genres_and_fills_in_values():
+    Row = namedtuple("Row", ["id", "version", *venue_fields])
+    values = dict.fromkeys(venue_fields)
+    values.update(name="The Musical Hop", genres="{Jazz,Reggae}")
+    edit = VenueEdit.load(Row(id=1, version=2, **values))
+    assert (edit.id, edit.version, edit.genres) == (1, 2, ["Jazz", "Reggae"])
+
+    detail = VenueDetail.load(
+        namedtuple("Row", ["id", *venue_fields])(id=1, **values),
+        **dict.fromkeys(DETAIL_FIELDS),
+        similar_venues=[],
+    )
+    assert detail.name == "The Musical Hop" and detail.similar_venues == []
@@ -0,0 +1,48 @@
+import numpy
+import pytest
+from scipy import sparse
+
+import recommendations
+from recommendations import _normalize, _similar, _top_k
+
+# Five rows over three genres; row 4 repeats row 0 and row 3 shares nothing
+FEATURES = [
+    [1, 0, 0],
+    [1, 1, 0],
+    [0, 1, 0],
+    [0, 0, 1],
+    [1, 0, 0],
+]
+HALF = 0.5**0.5
+
+
+def features():
+    return _normalize(sparse.csr_matrix(numpy.array(FEATURES, dtype=float)))
+
+
+def approx(results):
+    return [[(col, pytest.approx(score)) for col, score in row] for row in results]
+
+
+def test_similar_orders_by_score_then_column_and_skips_self():
+    assert _similar(features(), [0, 1, 2, 3, 4], 3) == approx(
+        [
+            [(4, 1.0), (1, HALF)],
+            [(0, HALF), (2, HALF), (4, HALF)],
+            [(1, HALF)],
+            [],
+            [(0, 1.0), (1, HALF)],
+        ]
+    )
+
+
+def test_similar_keeps_the_best_k(monkeypatch):
+    # Chunks of two rows give the same results as one chunk
+    monkeypatch.setattr(recommendations, "CHUNK", 2)
+    assert _similar(features(), [4, 0, 2], 1) == approx([[(0, 1.0)], [(4, 1.0)], [(1, HALF)]])
+
+
+def test_top_k_skips_excluded_columns_and_zero_scores():
+    scores = sparse.csr_matrix(numpy.array([[0.2, 0.9, 0.0, 0.5, 0.7]]))
+    assert _top_k(scores, 2, [[1]]) == approx([[(4, 0.7), (3, 0.5)]])
+    assert _top_k(scores, 10, [[]]) == approx([[(1, 0.9), (4, 0.7), (3, 0.5), (0, 0.2)]])
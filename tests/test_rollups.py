@@ -0,0 +1,21 @@
+from extensions import db
+from models import Rollup, RollupDelta
+from rollups import counter
+
+
+def test_counter_adds_pending_deltas_to_the_compacted_count(app):
+    db.metadata.create_all(db.engine, tables=[Rollup.__table__, RollupDelta.__table__])
+    db.session.add_all(
+        [
+            Rollup(metric="venue_shows", key="1", count=40),
+            Rollup(metric="artist_shows", key="1", count=7),
+            RollupDelta(id=1, metric="venue_shows", key="1", delta=1),
+            RollupDelta(id=2, metric="venue_shows", key="1", delta=-3),
+            RollupDelta(id=3, metric="venue_shows", key="2", delta=1),
+        ]
+    )
+    db.session.commit()
+
+    assert counter("venue_shows", 1) == 38
+    assert counter("venue_shows", 2) == 1
+    assert counter("venue_shows", 3) == 0
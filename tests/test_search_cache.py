@@ -0,0 +1,57 @@
+import pytest
+
+from search_cache import SearchCache, normalize_term
+
+
+@pytest.fixture
+def cache(app):
+    app.config.update(SEARCH_CACHE_MAX_BYTES=2000, SEARCH_CACHE_TTL=60)
+    return SearchCache()
+
+
+def test_normalize_term():
+    assert normalize_term("  the   wild ") == "the wild"
+    assert normalize_term(None) == ""
+
+
+def test_hits_ignore_case(cache):
+    cache.set("venues", "Park", [1, 2], cache.generation("venues"))
+    assert list(cache.get("venues", "park")) == [1, 2]
+    assert cache.get("artists", "park") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for term in "abcdef":
+        cache.set("venues", term, [1], 0)
+        cache.get("venues", "a")
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert stats["bytes"] <= 2000
+    assert cache.get("venues", "a") is not None
+    assert cache.get("venues", "b") is None
+
+
+def test_oversized_results_are_not_cached(cache):
+    cache.set("venues", "all", range(1000), 0)
+    assert cache.get("venues", "all") is None
+
+
+def test_expired_entries_miss(app, cache):
+    app.config["SEARCH_CACHE_TTL"] = 0
+    cache.set("venues", "park", [1], 0)
+    assert cache.get("venues", "park") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_entries_and_stale_results(cache):
+    generation = cache.generation("venues")
+    cache.set("venues", "park", [1], generation)
+    cache.set("artists", "park", [2], 0)
+    cache.invalidate("venues")
+    assert cache.get("venues", "park") is None
+    assert cache.get("artists", "park") is not None
+
+    # A search that started before the write doesn't store its results
+    cache.set("venues", "park", [1], generation)
+    assert cache.get("venues", "park") is None
@@ -0,0 +1,41 @@
+import pytest
+
+from models import Artist
+from search_index import PrefixIndex, normalize
+
+
+@pytest.fixture
+def index(app):
+    index = PrefixIndex(Artist)
+    index.load([(1, "The Wild Sax Band"), (2, "Guns N Petals"), (3, "Matt Quevedo"), (4, "the wilds")])
+    return index
+
+
+def test_normalize():
+    assert normalize("  Beyoncé   Knowles ") == "beyonce knowles"
+    assert normalize("GUNS  N Petals") == "guns n petals"
+
+
+def test_search_matches_prefixes_in_order(index):
+    assert index.search("the wild") == [(1, "The Wild Sax Band"), (4, "the wilds")]
+    assert index.search("THE WILDS") == [(4, "the wilds")]
+    assert index.search("the", limit=1) == [(1, "The Wild Sax Band")]
+    assert index.search("x") == []
+    assert index.search("   ") == []
+
+
+def test_add_renames_and_remove_drops(index):
+    index.add(5, "Guns Galore")
+    index.add(3, "Gunnar")
+    assert [id for id, _ in index.search("gun")] == [3, 5, 2]
+    index.remove(2)
+    index.remove(99)
+    assert [id for id, _ in index.search("gun")] == [3, 5]
+    assert len(index) == 4
+    assert 2 not in index and 3 in index
+
+
+def test_same_names_are_told_apart_by_id(index):
+    index.add(6, "The Wild Sax Band")
+    index.remove(1)
+    assert index.search("the wild sax") == [(6, "The Wild Sax Band")]
@@ -0,0 +1,170 @@
+from datetime import datetime
+import os
+
+from flask_migrate import Migrate, upgrade
+import pytest
+from sqlalchemy import event, func, select, text
+
+from extensions import db
+from models import Artist, Show, UpcomingShow, Venue
+import search_index
+from views.shows import parse_show_rows
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), os.pardir, "migrations")
+
+
+def test_parse_show_rows():
+    rows, errors = parse_show_rows(
+        "1, 2, 2027-05-21 21:30\n"
+        "\n"
+        "3\t4\t2027-06-01T20:00\n"
+        "5, 6\n"
+        "x, 6, 2027-06-01 20:00\n"
+        "5, 6, next friday\n"
+    )
+    assert rows == [
+        (1, {"artist_id": 1, "venue_id": 2, "start_time": datetime(2027, 5, 21, 21, 30)}),
+        (3, {"artist_id": 3, "venue_id": 4, "start_time": datetime(2027, 6, 1, 20)}),
+    ]
+    assert [number for number, _ in errors] == [4, 5, 6]
+    assert "expected artist ID" in errors[0][1]
+
+
+def test_parse_show_rows_of_nothing():
+    assert parse_show_rows("") == ([], [])
+
+
+@pytest.fixture
+def pg_app(database_url, tmp_path):
+    """An app on a scratch schema of the test database, dropped afterwards."""
+    from app import create_app
+
+    schema = "test_shows_batch"
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": database_url,
+            "SQLALCHEMY_ENGINE_OPTIONS": {
+                "connect_args": {"options": f"-csearch_path={schema}"}
+            },
+            "SEARCH_INDEX_PRELOAD": False,
+            "JOBS_EAGER": True,
+            "RATELIMIT_ENABLED": False,
+            "LOG_FILE": "",
+            "SNAPSHOT_DIR": str(tmp_path),
+        }
+    )
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+        Migrate(app, db, directory=MIGRATIONS)
+        upgrade()
+        db.session.add_all(
+            [
+                Artist(id=1, name="Guns N Petals", genres=["Rock n Roll"]),
+                Artist(id=2, name="Matt Quevedo", genres=["Jazz"]),
+                Venue(
+                    id=1,
+                    name="The Musical Hop",
+                    city="San Francisco",
+                    state="CA",
+                    genres=["Jazz"],
+                ),
+            ]
+        )
+        db.session.commit()
+        yield app
+        db.session.remove()
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+
+def post_batch(app, lines):
+    """POST a batch and return the response with the statements it ran up
+    to its commit, leaving out those of the jobs that run afterwards."""
+    statements = []
+    committed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not committed:
+            statements.append(statement)
+
+    def commit(conn):
+        committed.append(True)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    event.listen(db.engine, "commit", commit)
+    try:
+        response = app.test_client().post("/shows/batch", data={"shows": "\n".join(lines)})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+        event.remove(db.engine, "commit", commit)
+    return response, statements
+
+
+def test_batch_inserts_every_show_with_one_statement(pg_app):
+    response, statements = post_batch(
+        pg_app,
+        ["1, 1, 2035-05-21 21:30", "2, 1, 2035-06-01 20:00", "1, 1, 2035-07-01 20:00"],
+    )
+
+    assert b"3 shows were successfully listed!" in response.data
+    # One IN query per table checks every referenced ID
+    assert len([s for s in statements if s.startswith("SELECT artists.id")]) == 1
+    assert len([s for s in statements if s.startswith("SELECT venues.id")]) == 1
+    inserts = [s for s in statements if s.startswith("INSERT INTO shows ")]
+    assert len(inserts) == 1
+    assert "RETURNING shows.id" in inserts[0]
+    assert db.session.scalar(select(func.count()).select_from(Show)) == 3
+    assert db.session.scalar(select(func.count()).select_from(UpcomingShow)) == 3
+
+
+def test_batch_with_unknown_ids_reports_each_line_and_inserts_nothing(pg_app):
+    response, statements = post_batch(
+        pg_app, ["1, 1, 2035-05-21 21:30", "7, 1, 2035-06-01 20:00", "2, 9, 2035-07-01 20:00"]
+    )
+
+    assert b"there is no artist with ID 7" in response.data
+    assert b"there is no venue with ID 9" in response.data
+    assert not [s for s in statements if s.startswith("INSERT")]
+    assert db.session.scalar(select(func.count()).select_from(Show)) == 0
+
+
+def post_show(app, artist_id, venue_id):
+    return app.test_client().post(
+        "/shows/create",
+        data={"artist_id": artist_id, "venue_id": venue_id, "start_time": "2035-05-21 21:30:00"},
+    )
+
+
+def test_show_with_an_unknown_id_is_rejected(pg_app):
+    search_index.warm()
+
+    response = post_show(pg_app, 7, 1)
+
+    assert b"There is no artist with this ID." in response.data
+    assert db.session.scalar(select(func.count()).select_from(Show)) == 0
+
+
+def test_show_ids_missing_from_the_index_are_found_in_the_database(pg_app):
+    # As if both rows were created by another process since the last load
+    search_index.artists.load([])
+    search_index.venues.load([])
+
+    response = post_show(pg_app, 2, 1)
+
+    assert b"Show was successfully listed!" in response.data
+    assert 2 in search_index.artists and 1 in search_index.venues
+    assert db.session.scalar(select(func.count()).select_from(Show)) == 1
+
+
+def test_show_for_a_venue_deleted_elsewhere_is_rejected(pg_app):
+    # As if another process deleted venue 5 since this one indexed it
+    search_index.warm()
+    search_index.venues.add(5, "The Dueling Pianos Bar")
+
+    response = post_show(pg_app, 1, 5)
+
+    assert b"There is no venue with this ID." in response.data
+    assert 5 not in search_index.venues
+    assert db.session.scalar(select(func.count()).select_from(Show)) == 0
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from snapshot import Snapshot
+
+
+def areas(count):
+    return [
+        {"city": f"City {i}", "state": "CA", "venues": [{"id": i, "name": f"Venue {i}"}]}
+        for i in range(count)
+    ]
+
+
+def test_published_data_is_read_back(app):
+    snapshot = Snapshot("test", lambda: (areas(3), None))
+    published = snapshot.publish()
+
+    items = snapshot.get()
+    assert published["generation"] == 1
+    assert len(items) == 3
+    assert items[0] == areas(3)[0]
+    assert items[-1]["city"] == "City 2"
+    assert items[1:] == areas(3)[1:]
+    assert list(items) == areas(3)
+    with pytest.raises(IndexError):
+        items[3]
+
+
+def test_other_processes_see_a_new_generation(app):
+    count = [1]
+    writer = Snapshot("test", lambda: (areas(count[0]), None))
+    reader = Snapshot("test", writer.build)
+    writer.publish()
+    before = reader.get()
+
+    count[0] = 2
+    writer.publish()
+    assert reader.read()["generation"] == 2
+    assert len(reader.get()) == 2
+    # Requests still holding the old generation keep reading it
+    assert len(before) == 1 and before[0]["city"] == "City 0"
+
+
+def test_empty_and_expired_generations(app):
+    expires = [datetime.now() - timedelta(seconds=1)]
+    snapshot = Snapshot("test", lambda: ([], expires[0]))
+    assert snapshot.read() is None
+
+    assert list(snapshot.get()) == []
+    # Expired, so the next read publishes again
+    expires[0] = datetime.now() + timedelta(hours=1)
+    snapshot.get()
+    assert snapshot.read()["generation"] == 2
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds of imports allowed while importing app and calling
+# create_app(); override with STARTUP_BUDGET_MS on slow machines
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 1000))
+
+# Only needed once a page, form or command uses them, see create_app()
+LAZY_MODULES = [
+    "alembic",
+    "babel",
+    "dateutil",
+    "flask_migrate",
+    "numpy",
+    "redis",
+    "scipy",
+    "wtforms",
+]
+
+BOOT = """
+import sys
+from app import create_app
+create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "SEARCH_INDEX_PRELOAD": False})
+print(",".join(sorted(sys.modules)))
+"""
+
+
+def importtime(code, cwd):
+    """Run ``code`` under ``python -X importtime``. Returns what it printed and
+    {top-level import: cumulative microseconds}."""
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_LOG_FILE=os.path.join(cwd, "test.log"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented past the first space
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return result.stdout, times
+
+
+@pytest.fixture(scope="module")
+def boot(tmp_path_factory):
+    return importtime(BOOT, str(tmp_path_factory.mktemp("boot")))
+
+
+def test_startup_import_budget(boot):
+    _, times = boot
+    total = sum(times.values()) / 1000
+    slowest = sorted(times.items(), key=lambda item: -item[1])[:5]
+    assert total <= BUDGET_MS, f"imports took {total:.0f}ms, slowest: {slowest}"
+
+
+def test_heavy_modules_are_imported_lazily(boot):
+    output, _ = boot
+    loaded = set(output.strip().split(","))
+    assert [name for name in LAZY_MODULES if name in loaded] == []
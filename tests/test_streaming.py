@@ -0,0 +1,85 @@
+import gzip
+import zlib
+
+import pytest
+
+from streaming import FLUSH, CompressionMiddleware, _buffered
+
+PAGE = [b"<html>" + b"x" * 600, b"<p>more</p>", b"</html>"]
+
+
+def wsgi_app(body, content_type="text/html; charset=utf-8", status="200 OK", headers=()):
+    def app(environ, start_response):
+        start_response(status, [("Content-Type", content_type), *headers])
+        return iter(body)
+
+    return app
+
+
+def call(app, accept="gzip, br", method="GET"):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = status
+        started["headers"] = dict(headers)
+
+    environ = {"HTTP_ACCEPT_ENCODING": accept, "REQUEST_METHOD": method}
+    chunks = list(app(environ, start_response))
+    return started["headers"], chunks
+
+
+def test_buffered_joins_chunks_and_sends_at_flush():
+    chunks = ["a", "b", FLUSH, FLUSH, "c" * 5, "d", "e"]
+    assert list(_buffered(chunks, 4)) == ["ab", "ccccc", "de"]
+
+
+def test_gzip_flushes_every_chunk():
+    headers, chunks = call(CompressionMiddleware(wsgi_app(PAGE)), accept="gzip")
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(b"".join(chunks)) == b"".join(PAGE)
+
+    # Each chunk decompresses as soon as it arrives
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(chunks[0]) == PAGE[0]
+
+
+def test_brotli_is_preferred():
+    brotli = pytest.importorskip("brotli")
+    headers, chunks = call(CompressionMiddleware(wsgi_app(PAGE)))
+    assert headers["Content-Encoding"] == "br"
+    assert brotli.decompress(b"".join(chunks)) == b"".join(PAGE)
+
+
+@pytest.mark.parametrize(
+    "accept, encoding",
+    [
+        ("br;q=0, gzip", "gzip"),
+        ("gzip;q=0.5, br;q=0", "gzip"),
+        ("gzip;q=0, deflate", None),
+        ("gzip;q=0, br;q=0", None),
+    ],
+)
+def test_encodings_with_quality_zero_are_not_used(accept, encoding):
+    pytest.importorskip("brotli")
+    headers, chunks = call(CompressionMiddleware(wsgi_app(PAGE)), accept=accept)
+    assert headers.get("Content-Encoding") == encoding
+    if encoding is None:
+        assert b"".join(chunks) == b"".join(PAGE)
+
+
+@pytest.mark.parametrize(
+    "app, accept, method",
+    [
+        (wsgi_app(PAGE), "identity", "GET"),
+        (wsgi_app(PAGE), "gzip", "HEAD"),
+        (wsgi_app(PAGE, content_type="image/png"), "gzip", "GET"),
+        (wsgi_app(PAGE, status="304 Not Modified"), "gzip", "GET"),
+        (wsgi_app([b"tiny"], headers=[("Content-Length", "4")]), "gzip", "GET"),
+        (wsgi_app(PAGE, headers=[("Content-Encoding", "br")]), "gzip", "GET"),
+    ],
+)
+def test_other_responses_pass_through(app, accept, method):
+    headers, chunks = call(CompressionMiddleware(app), accept=accept, method=method)
+    assert headers.get("Content-Encoding") != "gzip"
+    assert b"".join(chunks) == b"".join(app({}, lambda *args: None))
@@ -0,0 +1,80 @@
+import json
+import time
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from tracing import tracer
+
+
+@pytest.fixture
+def traced_app(tmp_path):
+    """An app on an in-memory SQLite database with tracing on, writing to a
+    file under ``tmp_path``."""
+    from app import create_app
+
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "SEARCH_INDEX_PRELOAD": False,
+            "LOG_FILE": "",
+            "SNAPSHOT_DIR": str(tmp_path / "snapshots"),
+            "TRACING_ENABLED": True,
+            "TRACING_FILE": str(tmp_path / "traces.jsonl"),
+        }
+    )
+    try:
+        with app.app_context():
+            yield app
+            db.session.remove()
+    finally:
+        # The tracer is global; leave it off for the other tests
+        for handler in tracer._logger.handlers:
+            tracer._logger.removeHandler(handler)
+        tracer._logger = None
+        tracer.enabled = False
+
+
+def read_traces(path):
+    # Traces are written off the request thread
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if path.exists() and path.read_text().endswith("\n"):
+            break
+        time.sleep(0.01)
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_request_exports_its_spans_as_otlp_json(traced_app, tmp_path):
+    db.session.execute(text("CREATE TABLE artists (id INTEGER PRIMARY KEY, name VARCHAR)"))
+    db.session.execute(text("INSERT INTO artists VALUES (1, 'Guns N Petals')"))
+    db.session.commit()
+
+    traceparent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    response = traced_app.test_client().post(
+        "/artists/search", data={"search_term": "petals"}, headers={"traceparent": traceparent}
+    )
+    assert b"Guns N Petals" in response.data
+
+    [trace] = read_traces(tmp_path / "traces.jsonl")
+    [resource] = trace["resourceSpans"]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "fyyur"}}
+    ]
+    spans = resource["scopeSpans"][0]["spans"]
+    [root] = [span for span in spans if span["name"] == "POST /artists/search"]
+    assert root["traceId"] == "a" * 32 and root["parentSpanId"] == "b" * 16
+    assert response.headers["traceparent"] == f"00-{'a' * 32}-{root['spanId']}-01"
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
+
+    children = [span for span in spans if span is not root]
+    assert {span["traceId"] for span in children} == {"a" * 32}
+    assert {span["parentSpanId"] for span in children} == {root["spanId"]}
+    names = [span["name"] for span in children]
+    assert "sql" in names
+    assert "orm.hydrate" in names
+    assert "render pages/search_artists.html" in names
+    [hydrate] = [span for span in children if span["name"] == "orm.hydrate"]
+    assert {"key": "db.rows", "value": {"intValue": "1"}} in hydrate["attributes"]
@@ -0,0 +1,42 @@
+from collections import namedtuple
+from datetime import datetime
+from types import SimpleNamespace
+
+from utils import changed_fields, keyset_page, parse_cursor, process_array
+
+Row = namedtuple("Row", ["id", "start_time"])
+
+
+def test_process_array():
+    assert process_array('{Jazz,"Hip-Hop"}') == ["Jazz", "Hip-Hop"]
+
+
+def test_changed_fields_only_returns_differences():
+    venue = SimpleNamespace(name="Dueling Pianos", city="New York", phone=None, genres="{Jazz,Blues}")
+    data = {"name": "Dueling Pianos", "city": "Brooklyn", "phone": "", "genres": ["Jazz", "Blues"]}
+    assert changed_fields(venue, data) == {"city": "Brooklyn"}
+
+
+def test_changed_fields_compares_genres_as_lists():
+    venue = SimpleNamespace(genres="{Jazz,Blues}")
+    assert changed_fields(venue, {"genres": ["Jazz"]}) == {"genres": ["Jazz"]}
+    assert changed_fields(SimpleNamespace(genres=None), {"genres": []}) == {}
+
+
+def test_keyset_page_returns_the_cursor_of_the_last_row():
+    rows = [Row(id, datetime(2027, 1, id)) for id in range(1, 5)]
+    page, cursor = keyset_page(rows, 3)
+    assert page == rows[:3]
+    assert cursor == "2027-01-03T00:00:00_3"
+    assert parse_cursor(cursor) == (datetime(2027, 1, 3), 3)
+
+
+def test_keyset_page_has_no_cursor_on_the_last_page():
+    rows = [Row(1, datetime(2027, 1, 1))]
+    assert keyset_page(rows, 1) == (rows, None)
+    assert keyset_page([], 1) == ([], None)
+
+
+def test_parse_cursor_rejects_malformed_values():
+    for value in (None, "", "2027-01-03", "2027-01-03T00:00:00_x", "nope_3"):
+        assert parse_cursor(value) is None
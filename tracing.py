@@ -0,0 +1,309 @@
+from contextvars import ContextVar
+import functools
+import json
+import logging
+import os
+import re
+import secrets
+import time
+
+from flask import before_render_template, g, request, template_rendered
+from sqlalchemy.engine import Engine
+
+from hooks import listen_once
+from logs import QueueWriter
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+# W3C Trace Context: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current = ContextVar("tracing_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace. Use it as a context manager; spans
+    opened inside it become its children."""
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "attributes",
+        "start",
+        "end",
+        "error",
+        "_spans",
+        "_token",
+    )
+
+    def __init__(self, name, parent, kind=INTERNAL, **attributes):
+        self._begin(name, parent.trace_id, parent.span_id, kind, attributes)
+        # Finished spans are collected per trace and exported together
+        self._spans = parent._spans
+
+    def _begin(self, name, trace_id, parent_id, kind, attributes):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.finish(exc)
+        return False
+
+    def finish(self, error=None):
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = repr(error)
+        self._spans.append(self)
+
+    def to_otlp(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {},
+        }
+
+
+class RootSpan(Span):
+    """The first span of a trace in this process, e.g. of a request. It
+    continues the remote ``trace_id``/``parent_id`` if given, and exports
+    the trace once it finishes."""
+
+    __slots__ = ()
+
+    def __init__(self, name, kind=INTERNAL, trace_id=None, parent_id=None, **attributes):
+        self._begin(name, trace_id or secrets.token_hex(16), parent_id, kind, attributes)
+        self._spans = []
+
+    def finish(self, error=None):
+        super().finish(error)
+        tracer.export(self._spans)
+
+
+class _NoopSpan:
+    # What span() returns while tracing is off
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        value = {"boolValue": value}
+    elif isinstance(value, int):
+        value = {"intValue": str(value)}
+    elif isinstance(value, float):
+        value = {"doubleValue": value}
+    else:
+        value = {"stringValue": str(value)}
+    return {"key": key, "value": value}
+
+
+class Tracer:
+    """Request tracing, off unless ``TRACING_ENABLED`` is set.
+
+    Every request gets a root span, continuing the trace of an incoming
+    ``traceparent`` header, with child spans for SQL statements, template
+    rendering and whatever code wraps itself in ``span()`` or ``@traced``.
+    Finished traces are written off the request thread to ``TRACING_FILE``
+    (``instance/traces.jsonl`` by default), one OTLP/JSON
+    ``ExportTraceServiceRequest`` per line, which the OpenTelemetry
+    collector's file receiver and most trace viewers can read.
+
+    While tracing is off no hooks are installed, and ``span()`` and
+    ``@traced`` cost one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.service_name = None
+        self._logger = None
+
+    def init_app(self, app):
+        app.extensions["tracing"] = self
+        if not app.config["TRACING_ENABLED"]:
+            return
+
+        self.enabled = True
+        self.service_name = app.config["TRACING_SERVICE_NAME"]
+        if self._logger is None:
+            path = app.config["TRACING_FILE"] or os.path.join(
+                app.instance_path, "traces.jsonl"
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            output = logging.FileHandler(path)
+            output.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger("tracing.export")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(QueueWriter(output).handler)
+
+        app.before_request(_start_request)
+        app.after_request(_end_response)
+        app.teardown_request(_end_request)
+        before_render_template.connect(_start_render, app)
+        template_rendered.connect(_end_render, app)
+
+        listen_once(Engine, "before_cursor_execute", _before_cursor_execute)
+        listen_once(Engine, "after_cursor_execute", _after_cursor_execute)
+        listen_once(Engine, "handle_error", _handle_error)
+
+    def export(self, spans):
+        if self._logger is None:
+            return
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_attribute("service.name", self.service_name)]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "fyyur.tracing"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        self._logger.info(json.dumps(payload, separators=(",", ":")))
+
+
+tracer = Tracer()
+
+
+def current_span():
+    return _current.get()
+
+
+def span(name, parent=None, **attributes):
+    """Open a span, as a child of ``parent`` or of the current span.
+
+    ``parent`` carries a trace across threads and event loops, which don't
+    share the caller's context.
+    """
+    if not tracer.enabled:
+        return NOOP_SPAN
+    parent = parent or _current.get()
+    if parent is None:
+        return RootSpan(name, **attributes)
+    return Span(name, parent, **attributes)
+
+
+def traced(name):
+    """Decorator that runs a function in a span named ``name``."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ----------------------------------------------------------------------------#
+# Hooks.
+# ----------------------------------------------------------------------------#
+def _start_request():
+    match = TRACEPARENT.match(request.headers.get("traceparent", ""))
+    trace_id, parent_id = match.groups() if match else (None, None)
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        trace_id = parent_id = None
+
+    route = request.url_rule.rule if request.url_rule else request.path
+    root = RootSpan(
+        f"{request.method} {route}",
+        kind=SERVER,
+        trace_id=trace_id,
+        parent_id=parent_id,
+        **{"http.method": request.method, "http.route": route, "http.target": request.path},
+    )
+    g.trace_span = root
+    _current.set(root)
+
+
+def _end_response(response):
+    root = g.get("trace_span")
+    if root is not None:
+        root.set("http.status_code", response.status_code)
+        response.headers["traceparent"] = f"00-{root.trace_id}-{root.span_id}-01"
+    return response
+
+
+def _end_request(error):
+    root = g.pop("trace_span", None)
+    if root is not None:
+        _current.set(None)
+        root.finish(error)
+
+
+def _start_render(sender, template, context, **extra):
+    render = span("render " + (template.name or "template"))
+    render.__enter__()
+    g.setdefault("render_spans", []).append(render)
+
+
+def _end_render(sender, template, context, **extra):
+    renders = g.get("render_spans")
+    if renders:
+        renders.pop().__exit__(None, None, None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None:
+        return
+    sql = Span("sql", parent, kind=CLIENT, **{"db.statement": statement})
+    conn.info.setdefault("trace_spans", []).append(sql)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        spans.pop().finish()
+
+
+def _handle_error(context):
+    spans = context.connection.info.get("trace_spans") if context.connection else None
+    if spans:
+        spans.pop().finish(context.original_exception)
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import click
+from sqlalchemy import delete, insert, select, update
+
+from extensions import db
+from jobs import jobs
+from models import Artist, Show, UpcomingShow, Venue
+from snapshot import publish_snapshot
+
+
+def _projection(where):
+    # Columns of upcoming_shows, in table order, built from shows
+    return select(
+        Show.id,
+        Show.venue_id,
+        Show.artist_id,
+        Show.start_time,
+        Venue.name,
+        Venue.image_link,
+        Artist.name,
+        Artist.image_link,
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id
+    ).where(where)
+
+
+def _insert_from_shows(where):
+    return insert(UpcomingShow).from_select(
+        [
+            "show_id",
+            "venue_id",
+            "artist_id",
+            "start_time",
+            "venue_name",
+            "venue_image_link",
+            "artist_name",
+            "artist_image_link",
+        ],
+        _projection(where),
+    )
+
+
+# ----------------------------------------------------------------------------#
+# Jobs.
+# ----------------------------------------------------------------------------#
+@jobs.task
+def refresh_upcoming_shows(show_ids):
+    """Bring the projection rows of some shows in line with ``shows``."""
+    db.session.execute(
+        delete(UpcomingShow).where(UpcomingShow.show_id.in_(show_ids))
+    )
+    db.session.execute(
+        _insert_from_shows(Show.id.in_(show_ids) & (Show.start_time > datetime.now()))
+    )
+    # The venue directory counts upcoming shows from the projection, so it
+    # is republished in the same commit rather than racing this job
+    jobs.enqueue(publish_snapshot, name="venue_directory")
+    db.session.commit()
+
+
+@jobs.task
+def refresh_upcoming_show(show_id):
+    refresh_upcoming_shows([show_id])
+
+
+@jobs.task
+def refresh_upcoming_venue(venue_id):
+    """Copy a venue's name and image onto its upcoming shows."""
+    venue = db.session.get(Venue, venue_id)
+    if venue is None:
+        db.session.execute(
+            delete(UpcomingShow).where(UpcomingShow.venue_id == venue_id)
+        )
+    else:
+        db.session.execute(
+            update(UpcomingShow)
+            .where(UpcomingShow.venue_id == venue_id)
+            .values(venue_name=venue.name, venue_image_link=venue.image_link)
+        )
+    db.session.commit()
+
+
+@jobs.task
+def refresh_upcoming_artist(artist_id):
+    """Copy an artist's name and image onto their upcoming shows."""
+    artist = db.session.get(Artist, artist_id)
+    if artist is None:
+        db.session.execute(
+            delete(UpcomingShow).where(UpcomingShow.artist_id == artist_id)
+        )
+    else:
+        db.session.execute(
+            update(UpcomingShow)
+            .where(UpcomingShow.artist_id == artist_id)
+            .values(artist_name=artist.name, artist_image_link=artist.image_link)
+        )
+    db.session.commit()
+
+
+def prune_upcoming_shows():
+    """Drop shows that have started. Returns the number of rows removed."""
+    count = db.session.execute(
+        delete(UpcomingShow).where(UpcomingShow.start_time <= datetime.now())
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def rebuild_upcoming_shows():
+    """Recompute the whole projection from ``shows``."""
+    db.session.execute(delete(UpcomingShow))
+    db.session.execute(_insert_from_shows(Show.start_time > datetime.now()))
+    db.session.commit()
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@click.group("upcoming")
+def upcoming_cli():
+    """Maintain the upcoming_shows projection."""
+
+
+@upcoming_cli.command("prune")
+def prune_command():
+    """Remove shows that have started; run this on a schedule."""
+    click.echo(f"Removed {prune_upcoming_shows()} past shows.")
+
+
+@upcoming_cli.command("rebuild")
+def rebuild_command():
+    """Rebuild the projection from scratch."""
+    rebuild_upcoming_shows()
+    click.echo("Rebuilt upcoming_shows.")
@@ -1,4 +1,41 @@
+from datetime import datetime
+
+from tracing import traced
+
+
+@traced("process_array")
 def process_array(array):
     s = ''.join(array)
     s = s.strip("{}")
-    return [x.strip('"') for x in s.split(",")]
\ No newline at end of file
+    return [x.strip('"') for x in s.split(",")]
+
+
+def changed_fields(obj, data):
+    # Only the submitted values that differ from what is stored
+    changes = {}
+    for field, value in data.items():
+        current = getattr(obj, field)
+        if field == "genres":
+            current = process_array(current) if current else []
+        # Treat None, "" and [] alike so that empty form fields are no change
+        if (current or None) != (value or None):
+            changes[field] = value
+    return changes
+
+
+def keyset_page(rows, size):
+    # Split the size + 1 rows of a keyset query into a page and the cursor
+    # of the next page, None on the last one
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, f"{rows[-1].start_time.isoformat()}_{rows[-1].id}"
+
+
+def parse_cursor(value):
+    # (start_time, id) from a keyset_page() cursor, or None if malformed
+    start_time, _, id = (value or "").rpartition("_")
+    try:
+        return datetime.fromisoformat(start_time), int(id)
+    except ValueError:
+        return None
@@ -0,0 +1,319 @@
+from datetime import datetime
+from extensions import db
+from flask import (
+    abort,
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    jsonify,
+)
+from jobs import jobs
+from models import Artist, UpcomingShow, Venue, artist_fields
+from partitions import shows_with_archive
+from ratelimit import limiter
+from read_models import ArtistDetail, ArtistEdit, fetch
+from recommendations import related
+from rollups import counter, record_artists, record_shows
+from search_cache import normalize_term, search_cache
+import search_index
+from sqlalchemy import Integer, any_, bindparam, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm.exc import StaleDataError
+from streaming import stream_page, stream_rows
+from upcoming import refresh_upcoming_artist
+from utils import changed_fields, keyset_page, parse_cursor
+
+bp = Blueprint("artists", __name__, url_prefix="/artists")
+
+
+#  Artists
+#  ----------------------------------------------------------------
+@bp.route("")
+def artists():
+    # Fetched from a server-side cursor as the page renders, see streaming.py
+    artists = stream_rows(select(Artist.id, Artist.name).order_by(Artist.id))
+    return stream_page("pages/artists.html", artists=artists)
+
+
+@bp.route("/search", methods=["POST"])
+@limiter.limit("search")
+def search_artists():
+    # Get search term
+    search_term = normalize_term(request.form.get("search_term", ""))
+
+    # Popular terms are answered from the cache, see search_cache.py
+    ids = search_cache.get("artists", search_term)
+    generation = search_cache.generation("artists")
+
+    if ids is not None:
+        # The ids are bound as one array rather than a parameter each, so
+        # the statement is the same however many ids were cached
+        artists = fetch(
+            select(Artist.id, Artist.name)
+            .where(Artist.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer))))
+            .order_by(Artist.id)
+        )
+    else:
+        # Find artists based on substring search
+        artists = fetch(
+            select(Artist.id, Artist.name)
+            .filter(Artist.name.icontains(search_term))
+            .order_by(Artist.id)
+        )
+        search_cache.set("artists", search_term, [artist.id for artist in artists], generation)
+
+    # Check count of results
+    result_count = len(artists)
+
+    response = {"count": result_count, "data": artists}
+
+    return render_template(
+        "pages/search_artists.html",
+        results=response,
+        search_term=request.form.get("search_term", ""),
+    )
+
+
+@bp.route("/autocomplete")
+def autocomplete_artists():
+    # Answered from the in-memory prefix index, see search_index.py
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    matches = search_index.artists.search(request.args.get("q", ""), limit)
+    return jsonify([{"id": id, "name": name} for id, name in matches])
+
+
+def past_shows_query(artist_id, before=None):
+    """Select one page of past shows of an artist, newest first, plus one
+    more row to tell whether there is a next page (see keyset_page())."""
+    # Past shows may have been archived, see partitions.py
+    shows = shows_with_archive()
+    query = (
+        select(
+            shows.c.id,
+            shows.c.venue_id,
+            shows.c.start_time,
+            Venue.name.label("venue_name"),
+            Venue.image_link.label("venue_image_link"),
+        )
+        .join(Venue, Venue.id == shows.c.venue_id)
+        .where(shows.c.artist_id == artist_id, shows.c.start_time < datetime.now())
+        .order_by(shows.c.start_time.desc(), shows.c.id.desc())
+        .limit(current_app.config["PAST_SHOWS_PAGE_SIZE"] + 1)
+    )
+    if before is not None:
+        query = query.where(tuple_(shows.c.start_time, shows.c.id) < before)
+    return query
+
+
+@bp.route("/<int:artist_id>")
+def show_artist(artist_id):
+    now = datetime.now()
+
+    # Get artist by ID
+    artist = db.session.execute(
+        ArtistDetail.select().where(Artist.id == artist_id)
+    ).first()
+    if artist is None:
+        abort(404)
+
+    upcoming_shows = fetch(
+        select(
+            UpcomingShow.venue_id,
+            UpcomingShow.start_time,
+            UpcomingShow.venue_name,
+            UpcomingShow.venue_image_link,
+        )
+        .where(UpcomingShow.artist_id == artist_id, UpcomingShow.start_time > now)
+        .order_by(UpcomingShow.start_time)
+    )
+    # Only the first page of past shows; the rest loads on demand
+    past_shows, cursor = keyset_page(
+        fetch(past_shows_query(artist_id)),
+        current_app.config["PAST_SHOWS_PAGE_SIZE"],
+    )
+    past_count = len(past_shows)
+    if cursor:
+        # All booked shows from the rollups, less the upcoming ones
+        booked = counter("artist_shows", artist_id)
+        past_count = max(booked - len(upcoming_shows), past_count + 1)
+    # Precomputed, see recommendations.py
+    similar_artists = fetch(related("similar_artists", artist_id))
+    recommended_venues = fetch(related("recommended_venues", artist_id))
+
+    artist = ArtistDetail.load(
+        artist,
+        upcoming_shows=upcoming_shows,
+        upcoming_shows_count=len(upcoming_shows),
+        past_shows=past_shows,
+        past_shows_count=past_count,
+        past_shows_next=cursor
+        and url_for("artists.artist_past_shows", artist_id=artist_id, before=cursor),
+        similar_artists=similar_artists,
+        recommended_venues=recommended_venues,
+    )
+
+    return render_template("pages/show_artist.html", artist=artist)
+
+
+@bp.route("/<int:artist_id>/past-shows")
+def artist_past_shows(artist_id):
+    # HTML fragment with the past shows older than the ?before= cursor
+    before = parse_cursor(request.args.get("before"))
+    if before is None:
+        abort(400)
+
+    shows, cursor = keyset_page(
+        fetch(past_shows_query(artist_id, before)),
+        current_app.config["PAST_SHOWS_PAGE_SIZE"],
+    )
+    return render_template(
+        "pages/_artist_past_shows.html",
+        shows=shows,
+        next_url=cursor
+        and url_for("artists.artist_past_shows", artist_id=artist_id, before=cursor),
+    )
+
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route("/<int:artist_id>/edit", methods=["GET"])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+
+    # Get artist
+    artist = db.session.execute(ArtistEdit.select().where(Artist.id == artist_id)).first()
+    if artist is None:
+        abort(404)
+    artist = ArtistEdit.load(artist)
+
+    # Populate form
+    form = ArtistForm(obj=artist)
+
+    return render_template("forms/edit_artist.html", form=form, artist=artist)
+
+
+@bp.route("/<int:artist_id>/edit", methods=["POST"])
+@limiter.limit("write")
+def edit_artist_submission(artist_id):
+    # Get artist
+    # Updated syntax to avoid deprecation warning
+    artist = db.session.get(Artist, artist_id)
+
+    try:
+        # Someone else saved this artist after the form was loaded
+        if request.form.get("version", type=int) != artist.version:
+            flash("This artist was changed by someone else, please review it and try again.")
+            return redirect(url_for("artists.edit_artist", artist_id=artist_id))
+
+        # Get data from form
+        artist_data = {
+            field: request.form.getlist(field)
+            if field == "genres"
+            else request.form.get(field)
+            for field in artist_fields
+        }
+
+        # Deal with 'y' for seeking venue rather than bool
+        artist_data["seeking_venue"] = artist_data["seeking_venue"] == "y"
+
+        # Only write the columns that changed; an unchanged form is no UPDATE
+        changes = changed_fields(artist, artist_data)
+        if changes:
+            # Take the artist out of the dashboard counters it changes, and
+            # put it back once updated, see rollups.py
+            recount = changes.keys() & {"genres", "seeking_venue"}
+            shows = lambda c: c.artist_id == artist_id
+            if recount:
+                record_artists(Artist.id == artist_id, sign=-1)
+            if "genres" in changes:
+                record_shows(shows, sign=-1)
+
+            for field, value in changes.items():
+                setattr(artist, field, value)
+
+            if recount:
+                db.session.flush()
+                record_artists(Artist.id == artist_id)
+            if "genres" in changes:
+                record_shows(shows)
+
+            if "name" in changes or "image_link" in changes:
+                jobs.enqueue(refresh_upcoming_artist, artist_id=artist_id)
+
+            # Save to database; the UPDATE only matches the version we checked
+            db.session.commit()
+
+            if "name" in changes:
+                search_index.artists.add(artist_id, changes["name"])
+                search_cache.invalidate("artists")
+        return redirect(url_for("artists.show_artist", artist_id=artist_id))
+
+    except StaleDataError:
+        db.session.rollback()
+        flash("This artist was changed by someone else, please review it and try again.")
+        return redirect(url_for("artists.edit_artist", artist_id=artist_id))
+
+    except:
+        db.session.rollback()
+        current_app.logger.exception("Could not update artist %s", artist_id)
+        flash("Could not update this artist")
+        return redirect(url_for("artists.show_artist", artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+@bp.route("/create", methods=["GET"])
+def create_artist_form():
+    from forms import ArtistForm
+
+    form = ArtistForm()
+    return render_template("forms/new_artist.html", form=form)
+
+
+@bp.route("/create", methods=["POST"])
+@limiter.limit("write")
+def create_artist_submission():
+    from forms import ArtistForm
+
+    form = ArtistForm()
+
+    if form.validate_on_submit():
+
+        try:
+            artist_data = {
+                field: request.form.getlist(field)
+                if field == "genres"
+                else request.form.get(field)
+                for field in artist_fields
+            }
+
+            if artist_data["seeking_venue"] == "y":
+                artist_data["seeking_venue"] = True
+            else:
+                artist_data["seeking_venue"] = False
+
+            new_artist = Artist(**artist_data)
+
+            db.session.add(new_artist)
+            db.session.flush()
+            record_artists(Artist.id == new_artist.id)
+            db.session.commit()
+            search_index.artists.add(new_artist.id, new_artist.name)
+            search_cache.invalidate("artists")
+            flash("Artist " + request.form["name"] + " was successfully listed!")
+
+        except:
+            db.session.rollback()
+            current_app.logger.exception("Could not create artist")
+        finally:
+            db.session.close()
+
+    else:
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+
+    return render_template("pages/home.html")
@@ -0,0 +1,224 @@
+from datetime import datetime
+from extensions import db
+from jobs import jobs
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    flash,
+)
+from models import Artist, Show, Venue
+from partitions import shows_with_archive
+from ratelimit import limiter
+from recommendations import update_recommendations
+from rollups import record_shows
+import re
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+import search_index
+from streaming import stream_page, stream_rows
+from upcoming import refresh_upcoming_show, refresh_upcoming_shows
+
+bp = Blueprint("shows", __name__, url_prefix="/shows")
+
+
+#  Shows
+#  ----------------------------------------------------------------
+@bp.route("")
+def shows():
+    # Archived shows are listed too, see partitions.py
+    shows = shows_with_archive()
+    # Fetched from a server-side cursor as the page renders, see streaming.py
+    rows = stream_rows(
+        select(
+            shows.c.venue_id,
+            shows.c.artist_id,
+            shows.c.start_time,
+            Venue.name.label("venue_name"),
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == shows.c.venue_id)
+        .join(Artist, Artist.id == shows.c.artist_id)
+        .order_by(shows.c.start_time)
+    )
+
+    return stream_page("pages/shows.html", shows=rows)
+
+
+@bp.route("/create")
+def create_shows():
+    from forms import ShowForm
+
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template("forms/new_show.html", form=form)
+
+
+@bp.route("/create", methods=["POST"])
+@limiter.limit("write")
+def create_show_submission():
+    from forms import ShowForm
+
+    # Unknown artist and venue IDs are rejected here, without an INSERT
+    form = ShowForm()
+    if not form.validate_on_submit():
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+        return render_template("forms/new_show.html", form=form)
+
+    # Set up error handling
+    error = False
+
+    try:
+        new_show = Show(
+            artist_id=form.artist_id.data,
+            venue_id=form.venue_id.data,
+            start_time=form.start_time.data,
+        )
+
+        db.session.add(new_show)
+        db.session.flush()
+        record_shows(lambda c: c.id == new_show.id)
+        jobs.enqueue(refresh_upcoming_show, show_id=new_show.id)
+        jobs.enqueue(
+            update_recommendations,
+            artist_ids=[new_show.artist_id],
+            venue_ids=[new_show.venue_id],
+        )
+        db.session.commit()
+
+    except IntegrityError:
+        # The index can still hold an artist or venue that another process
+        # deleted; forget both IDs and check them against the database again
+        db.session.rollback()
+        search_index.artists.remove(form.artist_id.data)
+        search_index.venues.remove(form.venue_id.data)
+        if form.validate():
+            error = True
+            current_app.logger.exception("Could not create show")
+        else:
+            for field, message in form.errors.items():
+                flash(field + ' - ' + str(message), 'danger')
+            return render_template("forms/new_show.html", form=form)
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception("Could not create show")
+    finally:
+        db.session.close()
+
+    if error:
+        flash("An error occurred. Show could not be listed.")
+        return render_template("pages/home.html")
+    else:
+        flash("Show was successfully listed!")
+        return render_template("pages/home.html")
+
+
+#  Batch scheduling
+#  ----------------------------------------------------------------
+def parse_show_rows(text):
+    """Parse "artist_id, venue_id, start_time" lines.
+
+    Returns the parsed rows and a list of ``(line number, message)`` errors.
+    """
+    rows = []
+    errors = []
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+
+        parts = [part.strip() for part in re.split(r"[,\t]", line)]
+        if len(parts) != 3:
+            errors.append((number, "expected artist ID, venue ID and start time"))
+            continue
+
+        artist_id, venue_id, start_time = parts
+        try:
+            row = {
+                "artist_id": int(artist_id),
+                "venue_id": int(venue_id),
+                "start_time": datetime.fromisoformat(start_time),
+            }
+        except ValueError:
+            errors.append(
+                (number, "IDs must be numbers and the start time YYYY-MM-DD HH:MM")
+            )
+            continue
+
+        rows.append((number, row))
+
+    return rows, errors
+
+
+@bp.route("/batch")
+def create_shows_batch():
+    from forms import ShowBatchForm
+
+    form = ShowBatchForm()
+    return render_template("forms/new_shows_batch.html", form=form, errors=[])
+
+
+@bp.route("/batch", methods=["POST"])
+@limiter.limit("write")
+def create_shows_batch_submission():
+    from forms import ShowBatchForm
+
+    form = ShowBatchForm()
+    if not form.validate_on_submit():
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+        return render_template("forms/new_shows_batch.html", form=form, errors=[])
+
+    rows, errors = parse_show_rows(form.shows.data)
+
+    limit = current_app.config["SHOWS_BATCH_LIMIT"]
+    if len(rows) > limit:
+        errors.append((rows[limit][0], f"at most {limit} shows can be listed at once"))
+    elif rows:
+        # Check every referenced artist and venue with one query per table
+        artist_ids = {row["artist_id"] for _, row in rows}
+        venue_ids = {row["venue_id"] for _, row in rows}
+        known_artists = set(
+            db.session.scalars(select(Artist.id).where(Artist.id.in_(artist_ids)))
+        )
+        known_venues = set(
+            db.session.scalars(select(Venue.id).where(Venue.id.in_(venue_ids)))
+        )
+
+        for number, row in rows:
+            if row["artist_id"] not in known_artists:
+                errors.append((number, f"there is no artist with ID {row['artist_id']}"))
+            if row["venue_id"] not in known_venues:
+                errors.append((number, f"there is no venue with ID {row['venue_id']}"))
+
+    if errors:
+        db.session.rollback()
+        return render_template(
+            "forms/new_shows_batch.html", form=form, errors=sorted(errors)
+        )
+
+    try:
+        # A single multi-row INSERT in one transaction
+        show_ids = db.session.scalars(
+            insert(Show).values([row for _, row in rows]).returning(Show.id)
+        ).all()
+        record_shows(lambda c: c.id.in_(show_ids))
+        jobs.enqueue(refresh_upcoming_shows, show_ids=show_ids)
+        jobs.enqueue(
+            update_recommendations,
+            artist_ids=sorted(artist_ids),
+            venue_ids=sorted(venue_ids),
+        )
+        db.session.commit()
+        flash(f"{len(show_ids)} shows were successfully listed!")
+    except:
+        db.session.rollback()
+        current_app.logger.exception("Could not create %d shows", len(rows))
+        flash("An error occurred. Shows could not be listed.")
+    finally:
+        db.session.close()
+
+    return render_template("pages/home.html")
@@ -0,0 +1,400 @@
+from datetime import datetime, timedelta
+from extensions import db
+from flask import (
+    abort,
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    jsonify,
+)
+from jobs import jobs
+from models import Artist, Show, UpcomingShow, Venue, venue_fields
+from partitions import shows_with_archive
+from ratelimit import limiter
+from read_models import VenueDetail, VenueEdit, fetch
+from recommendations import related
+from rollups import counter, record_shows, record_venues
+from search_cache import normalize_term, search_cache
+import search_index
+from snapshot import publish_snapshot, venue_directory
+from sqlalchemy import (
+    Integer,
+    String,
+    any_,
+    bindparam,
+    cast,
+    exists,
+    select,
+    tuple_,
+    type_coerce,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from streaming import stream_page
+from upcoming import refresh_upcoming_venue
+from utils import changed_fields, keyset_page, parse_cursor
+
+bp = Blueprint("venues", __name__, url_prefix="/venues")
+
+
+#  Venues
+#  ----------------------------------------------------------------
+@bp.route("")
+def venues():
+    # Shared by all worker processes, see snapshot.py
+    areas = venue_directory.get()
+    return stream_page("pages/venues.html", areas=areas)
+
+
+@bp.route("/search", methods=["POST"])
+@limiter.limit("search")
+def search_venues():
+    # Get search term
+    search_term = normalize_term(request.form.get("search_term", ""))
+
+    # Popular terms are answered from the cache, see search_cache.py
+    ids = search_cache.get("venues", search_term)
+    generation = search_cache.generation("venues")
+
+    if ids is not None:
+        # The ids are bound as one array rather than a parameter each, so
+        # the statement is the same however many ids were cached
+        venues = fetch(
+            select(Venue.id, Venue.name)
+            .where(Venue.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer))))
+            .order_by(Venue.id)
+        )
+    else:
+        # Find venues based on substring search
+        venues = fetch(
+            select(Venue.id, Venue.name)
+            .filter(Venue.name.icontains(search_term))
+            .order_by(Venue.id)
+        )
+        search_cache.set("venues", search_term, [venue.id for venue in venues], generation)
+
+    # Check count of results
+    result_count = len(venues)
+
+    response = {"count": result_count, "data": venues}
+    return render_template(
+        "pages/search_venues.html",
+        results=response,
+        search_term=request.form.get("search_term", ""),
+    )
+
+
+@bp.route("/availability")
+@limiter.limit("search")
+def venue_availability():
+    from forms import AvailabilityForm
+
+    form = AvailabilityForm(formdata=request.args or None)
+    if not (request.args and form.validate()):
+        return render_template("pages/venue_availability.html", form=form, venues=None)
+
+    # A show blocks its venue from its start until SHOW_DURATION_HOURS later.
+    # NOT EXISTS is an anti-join that probes ix_shows_venue_id_start_time once
+    # per venue; archived shows are all in the past and never clash.
+    duration = timedelta(hours=current_app.config["SHOW_DURATION_HOURS"])
+    clashing = select(Show.id).where(
+        Show.venue_id == Venue.id,
+        Show.start_time > form.start.data - duration,
+        Show.start_time < form.end.data,
+    )
+    query = select(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link
+    ).where(~exists(clashing))
+    city = (form.city.data or "").strip()
+    if city:
+        query = query.where(Venue.city.ilike(city))
+    if form.state.data:
+        query = query.where(Venue.state == form.state.data)
+    if form.genre.data:
+        # genres is stored as array text such as {Jazz,"Rock n Roll"}
+        genres = cast(type_coerce(Venue.genres, String), ARRAY(String))
+        query = query.where(genres.any(form.genre.data))
+
+    limit = current_app.config["AVAILABILITY_LIMIT"]
+    query = query.order_by(Venue.state, Venue.city, Venue.name).limit(limit + 1)
+    venues = fetch(query)
+    return render_template(
+        "pages/venue_availability.html",
+        form=form,
+        venues=venues[:limit],
+        more=len(venues) > limit,
+    )
+
+
+@bp.route("/autocomplete")
+def autocomplete_venues():
+    # Answered from the in-memory prefix index, see search_index.py
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    matches = search_index.venues.search(request.args.get("q", ""), limit)
+    return jsonify([{"id": id, "name": name} for id, name in matches])
+
+
+def past_shows_query(venue_id, before=None):
+    """Select one page of past shows of a venue, newest first, plus one
+    more row to tell whether there is a next page (see keyset_page())."""
+    # Past shows may have been archived, see partitions.py
+    shows = shows_with_archive()
+    query = (
+        select(
+            shows.c.id,
+            shows.c.artist_id,
+            shows.c.start_time,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Artist, Artist.id == shows.c.artist_id)
+        .where(shows.c.venue_id == venue_id, shows.c.start_time < datetime.now())
+        .order_by(shows.c.start_time.desc(), shows.c.id.desc())
+        .limit(current_app.config["PAST_SHOWS_PAGE_SIZE"] + 1)
+    )
+    if before is not None:
+        query = query.where(tuple_(shows.c.start_time, shows.c.id) < before)
+    return query
+
+
+@bp.route("/<int:venue_id>")
+def show_venue(venue_id):
+    now = datetime.now()
+
+    # Get venue using venue_id
+    venue = db.session.execute(VenueDetail.select().where(Venue.id == venue_id)).first()
+
+    if venue:
+        upcoming_shows = fetch(
+            select(
+                UpcomingShow.artist_id,
+                UpcomingShow.start_time,
+                UpcomingShow.artist_name,
+                UpcomingShow.artist_image_link,
+            )
+            .where(UpcomingShow.venue_id == venue_id, UpcomingShow.start_time > now)
+            .order_by(UpcomingShow.start_time)
+        )
+        # Only the first page of past shows; the rest loads on demand
+        past_shows, cursor = keyset_page(
+            fetch(past_shows_query(venue_id)),
+            current_app.config["PAST_SHOWS_PAGE_SIZE"],
+        )
+        past_count = len(past_shows)
+        if cursor:
+            # All booked shows from the rollups, less the upcoming ones
+            booked = counter("venue_shows", venue_id)
+            past_count = max(booked - len(upcoming_shows), past_count + 1)
+        # Precomputed, see recommendations.py
+        similar_venues = fetch(related("similar_venues", venue_id))
+
+        venue = VenueDetail.load(
+            venue,
+            upcoming_shows=upcoming_shows,
+            upcoming_shows_count=len(upcoming_shows),
+            past_shows=past_shows,
+            past_shows_count=past_count,
+            past_shows_next=cursor
+            and url_for("venues.venue_past_shows", venue_id=venue_id, before=cursor),
+            similar_venues=similar_venues,
+        )
+        return render_template("pages/show_venue.html", venue=venue)
+    else:
+        # If no such venue exists, flash and redirect to venues home
+        flash("Venue not found.")
+        return redirect(url_for("venues.venues"))
+
+
+@bp.route("/<int:venue_id>/past-shows")
+def venue_past_shows(venue_id):
+    # HTML fragment with the past shows older than the ?before= cursor
+    before = parse_cursor(request.args.get("before"))
+    if before is None:
+        abort(400)
+
+    shows, cursor = keyset_page(
+        fetch(past_shows_query(venue_id, before)),
+        current_app.config["PAST_SHOWS_PAGE_SIZE"],
+    )
+    return render_template(
+        "pages/_venue_past_shows.html",
+        shows=shows,
+        next_url=cursor
+        and url_for("venues.venue_past_shows", venue_id=venue_id, before=cursor),
+    )
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+@bp.route("/create", methods=["GET"])
+def create_venue_form():
+    from forms import VenueForm
+
+    form = VenueForm()
+    return render_template("forms/new_venue.html", form=form)
+
+
+@bp.route("/create", methods=["POST"])
+@limiter.limit("write")
+def create_venue_submission():
+    from forms import VenueForm
+
+    form = VenueForm()
+
+    if form.validate_on_submit():
+
+        try:
+            # Grab form data
+            venue_data = {
+                field: request.form.getlist(field)
+                if field == "genres"
+                else request.form.get(field)
+                for field in venue_fields
+            }
+
+            # Need to figure out best way to convert this to bool
+            if venue_data["seeking_talent"] == "y":
+                venue_data["seeking_talent"] = True
+            else:
+                venue_data["seeking_talent"] = False
+
+            new_venue = Venue(**venue_data)
+
+            db.session.add(new_venue)
+            db.session.flush()
+            record_venues(Venue.id == new_venue.id)
+            jobs.enqueue(publish_snapshot, name="venue_directory")
+            db.session.commit()
+            search_index.venues.add(new_venue.id, new_venue.name)
+            search_cache.invalidate("venues")
+            flash("Venue " + request.form.get("name") + " was successfully listed!")
+
+        except:
+            db.session.rollback()
+            current_app.logger.exception("Could not create venue")
+        finally:
+            db.session.close()
+    else:
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+    return render_template("pages/home.html")
+
+
+@bp.route("/<venue_id>", methods=["POST"])
+@limiter.limit("write")
+def delete_venue(venue_id):
+    method = request.form.get("_method", "POST")
+
+    if method == "DELETE":
+        try:
+            record_venues(Venue.id == venue_id, sign=-1)
+            Venue.query.filter_by(id=venue_id).delete()
+            jobs.enqueue(publish_snapshot, name="venue_directory")
+            db.session.commit()
+            search_index.venues.remove(int(venue_id))
+            search_cache.invalidate("venues")
+            flash("Venue successfully deleted.")
+        except IntegrityError:
+            current_app.logger.info("Venue %s has shows, not deleting it", venue_id)
+            db.session.rollback()
+            flash("Venue could not be deleted because there are shows listed for it.")
+        except Exception:
+            current_app.logger.exception("Could not delete venue %s", venue_id)
+            db.session.rollback()
+            flash("Venue could not be deleted.")
+        finally:
+            db.session.close()
+        return redirect(url_for("venues.venues"))
+
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route("/<int:venue_id>/edit", methods=["GET"])
+def edit_venue(venue_id):
+    from forms import VenueForm
+
+    # Get venue
+    venue = db.session.execute(VenueEdit.select().where(Venue.id == venue_id)).first()
+    if venue is None:
+        abort(404)
+    venue = VenueEdit.load(venue)
+
+    # Populate form
+    form = VenueForm(obj=venue)
+
+    return render_template("forms/edit_venue.html", form=form, venue=venue)
+
+
+@bp.route("/<int:venue_id>/edit", methods=["POST"])
+@limiter.limit("write")
+def edit_venue_submission(venue_id):
+    # Get venue
+    # Updated syntax to avoid deprecation warning
+    venue = db.session.get(Venue, venue_id)
+
+    try:
+        # Someone else saved this venue after the form was loaded
+        if request.form.get("version", type=int) != venue.version:
+            flash("This venue was changed by someone else, please review it and try again.")
+            return redirect(url_for("venues.edit_venue", venue_id=venue_id))
+
+        # Get data from form
+        venue_data = {
+            field: request.form.getlist(field)
+            if field == "genres"
+            else request.form.get(field)
+            for field in venue_fields
+        }
+
+        # Deal with 'y' for seeking venue rather than bool
+        venue_data["seeking_talent"] = venue_data["seeking_talent"] == "y"
+
+        # Only write the columns that changed; an unchanged form is no UPDATE
+        changes = changed_fields(venue, venue_data)
+        if changes:
+            # Take the venue out of the dashboard counters it changes, and
+            # put it back once updated, see rollups.py
+            recount = changes.keys() & {"state", "seeking_talent"}
+            shows = lambda c: c.venue_id == venue_id
+            if recount:
+                record_venues(Venue.id == venue_id, sign=-1)
+            if "state" in changes:
+                record_shows(shows, sign=-1)
+
+            for field, value in changes.items():
+                setattr(venue, field, value)
+
+            if recount:
+                db.session.flush()
+                record_venues(Venue.id == venue_id)
+            if "state" in changes:
+                record_shows(shows)
+
+            if "name" in changes or "image_link" in changes:
+                jobs.enqueue(refresh_upcoming_venue, venue_id=venue_id)
+            if changes.keys() & {"name", "city", "state"}:
+                jobs.enqueue(publish_snapshot, name="venue_directory")
+
+            # Save to database; the UPDATE only matches the version we checked
+            db.session.commit()
+
+            if "name" in changes:
+                search_index.venues.add(venue_id, changes["name"])
+                search_cache.invalidate("venues")
+        return redirect(url_for("venues.show_venue", venue_id=venue_id))
+
+    except StaleDataError:
+        db.session.rollback()
+        flash("This venue was changed by someone else, please review it and try again.")
+        return redirect(url_for("venues.edit_venue", venue_id=venue_id))
+
+    except:
+        db.session.rollback()
+        current_app.logger.exception("Could not update venue %s", venue_id)
+        flash("Could not update this venue")
+        return redirect(url_for("venues.show_venue", venue_id=venue_id))